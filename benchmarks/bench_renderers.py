@@ -0,0 +1,225 @@
+# --
+# Copyright (c) 2014-2026 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Benchmarks of the hot paths of the HTML renderers.
+
+Only the standard library is used to time the imports of the modules, then
+the tag creations, the serializations, the rendering of the head, the rewriting
+of the assets URLs and the parsing, on small, medium and huge synthetic pages.
+
+Usage:
+  python benchmarks/bench_renderers.py [-o results.json] [-c previous.json] [-t 1.1] [-f filter]
+"""
+
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import subprocess
+
+from lxml import etree as ET
+
+from nagare.renderers import html_base as html
+from nagare.renderers import html5_base, xhtml_base
+
+MODULES = ('lxml.etree', 'nagare.renderers.html_base', 'nagare.renderers.html5_base')
+IMPORT = 'import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)'
+SIZES = {'small': 10, 'medium': 200, 'huge': 5000}
+RENDERERS = {
+    'html': (html.Renderer, 'html'),
+    'html5': (html5_base.Renderer, 'html'),
+    'xhtml': (xhtml_base.Renderer, 'xml'),
+}
+
+# ---------------------------------------------------------------------------
+
+
+def build_page(renderer_factory, nb_rows):
+    h = renderer_factory(static_url='/static', assets_version='1.2')
+
+    with h.html:
+        with h.head.head:
+            h.head << h.head.title('Benchmark')
+
+        with h.body(class_='page'):
+            with h.div(id='menu', class_='menu'), h.ul:
+                for i in range(10):
+                    h << h.li(h.a('Item %d' % i, href='/item/%d' % i, class_='item'))
+
+            with h.table(class_='grid'):
+                with h.tr:
+                    for column in ('id', 'name', 'price', 'image'):
+                        h << h.th(column)
+
+                for i in range(nb_rows):
+                    with h.tr(class_='odd' if i % 2 else 'even'):
+                        h << h.td(i)
+                        h << h.td('Product <%d>' % i)
+                        h << h.td('%d.99' % i, style='text-align: right')
+                        h << h.td(h.img(src='images/product_%d.png' % (i % 50), alt='product'))
+
+            with h.div(id='footer'):
+                h << h.p('Footer', h.span('text', class_='small'))
+
+    return h, h.root
+
+
+def register_assets(head, nb_assets):
+    for i in range(nb_assets):
+        head.css_url('css/style_%d.css' % i, bottom=bool(i % 4 == 0))
+        head.javascript_url('js/script_%d.js' % i, bottom=bool(i % 3 == 0))
+        head.css('css_%d' % i, '.c%d { color: red }' % i)
+        head.javascript('js_%d' % i, 'function f%d() {}' % i, bottom=bool(i % 2))
+
+
+def benchmarks(renderer_name, size):
+    renderer_factory, method = RENDERERS[renderer_name]
+    nb_rows = SIZES[size]
+
+    h, root = build_page(renderer_factory, nb_rows)
+    serialized = root.tostring(method=method)
+
+    def head_rendering():
+        head = renderer_factory(static_url='/static', assets_version='1.2').head
+        register_assets(head, nb_rows)
+        head.render_top()
+        head.render_bottom()
+
+    urls = ['images/product_%d.png' % (i % 50) for i in range(nb_rows)]
+
+    def assets_urls():
+        for url in urls:
+            h.absolute_asset_url(url)
+
+    def assets_urls_uncached():
+        h.head.assets_url_cache.clear()
+        assets_urls()
+
+    rows = [(i, 'Product <%d>' % i, '%d.99' % i, 'images/product_%d.png' % (i % 50)) for i in range(nb_rows)]
+
+    return {
+        'tag_creation': lambda: build_page(renderer_factory, nb_rows),
+        'table_from_rows': lambda: h.table_from_rows(rows, ('id', 'name', 'price', 'image'), class_='grid'),
+        'tostring': lambda: root.tostring(method=method),
+        'head_rendering': head_rendering,
+        'absolute_asset_url': assets_urls,
+        'absolute_asset_url_uncached': assets_urls_uncached,
+        'fromstring': lambda: h.fromstring(serialized.decode('utf-8')),
+    }
+
+
+def measure(f, repeat, min_time):
+    timer = timeit.Timer(f, timer=time.perf_counter)
+
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return {'best': min(times), 'mean': sum(times) / len(times), 'loops': number, 'repeat': repeat}
+
+
+def measure_import(module, repeat):
+    """Duration of the import of a module into a fresh interpreter."""
+    times = [
+        float(subprocess.check_output([sys.executable, '-c', IMPORT % module]))  # noqa: S603
+        for _ in range(repeat * 4)
+    ]
+
+    return {'best': min(times), 'mean': sum(times) / len(times), 'loops': 1, 'repeat': len(times)}
+
+
+def run(pattern='', repeat=5, min_time=0.2):
+    results = {}
+
+    for module in MODULES:
+        key = 'import.%s' % module
+        if pattern in key:
+            results[key] = measure_import(module, repeat)
+            print('%-45s %12.3f us' % (key, results[key]['best'] * 1e6), file=sys.stderr)
+
+    for renderer_name in RENDERERS:
+        for size in SIZES:
+            for name, f in benchmarks(renderer_name, size).items():
+                key = '%s.%s.%s' % (name, renderer_name, size)
+                if pattern in key:
+                    results[key] = measure(f, repeat, min_time)
+                    print('%-45s %12.3f us' % (key, results[key]['best'] * 1e6), file=sys.stderr)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'lxml': '.'.join(map(str, ET.LXML_VERSION)),
+            'libxml': '.'.join(map(str, ET.LIBXML_VERSION)),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(previous, current, threshold):
+    """Compare two results.
+
+    In:
+      - ``previous`` -- the reference results
+      - ``current`` -- the new results
+      - ``threshold`` -- maximum ratio of the new times on the reference times
+
+    Return:
+      - the names of the regressed benchmarks
+    """
+    regressions = []
+
+    for key, result in sorted(current['results'].items()):
+        reference = previous['results'].get(key)
+        if reference is not None:
+            ratio = result['best'] / reference['best']
+            print('%-45s %8.2fx' % (key, ratio), file=sys.stderr)
+
+            if ratio > threshold:
+                regressions.append(key)
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the HTML renderers')
+    parser.add_argument('-o', '--output', help='JSON file where to write the results (stdout by default)')
+    parser.add_argument('-c', '--compare', help='JSON results to compare with')
+    parser.add_argument('-t', '--threshold', type=float, default=1.1, help='maximum slowdown ratio on comparison')
+    parser.add_argument('-f', '--filter', default='', help='only run the benchmarks whose name contains this text')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='number of measures of each benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum duration of each measure, in seconds')
+    args = parser.parse_args(args)
+
+    results = run(args.filter, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+
+        if regressions:
+            print('Regressions: ' + ', '.join(regressions), file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# --
+# Copyright (c) 2014-2026 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Infrastructure of the static assets: cache, manifest, bundles and integrity values."""
+
+import os
+import re
+import time
+import itertools
+import threading
+import urllib.parse as urlparse
+from collections import OrderedDict
+
+# Size of the chunks read from the assets files
+CHUNK_SIZE = 64 * 1024
+
+# ---------------------------------------------------------------------------
+
+
+class LRUCache:
+    """A bounded, thread-safe, least recently used cache."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """Initialization.
+
+        In:
+          - ``maxsize`` -- maximum number of entries kept (``0`` disables the cache)
+          - ``ttl`` -- default number of seconds an entry is kept (forever if ``None``)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (expiration time, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, create, *args, ttl=None):
+        """Return the value of ``key``, creating it on a miss.
+
+        In:
+          - ``key`` -- the (hashable) key
+          - ``create`` -- function called with ``args`` to create a missing value
+          - ``ttl`` -- number of seconds a created value is kept (``self.ttl`` if ``None``)
+
+        Return:
+          - the value
+        """
+        with self._lock:
+            expiration, value = self._entries.get(key, (0, None))
+            if (expiration is None) or (expiration > time.monotonic()):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+
+            self.misses += 1
+            if expiration:
+                del self._entries[key]
+
+        value = create(*args)
+
+        if self.maxsize > 0:
+            ttl = self.ttl if ttl is None else ttl
+            expiration = None if ttl is None else (time.monotonic() + ttl)
+
+            with self._lock:
+                self._entries[key] = (expiration, value)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Statistics of the cache.
+
+        Return:
+          - dictionary of ``hits``, ``misses``, ``size`` and ``maxsize``
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+class AssetsManifest:
+    """Map of the assets paths to their fingerprinted paths.
+
+    The paths are relative to the static contents directory.
+    """
+
+    def __init__(self, paths):
+        """Initialization.
+
+        In:
+          - ``paths`` -- dictionary of the assets paths to their fingerprinted paths
+        """
+        self.paths = {path.lstrip('/'): fingerprinted.lstrip('/') for path, fingerprinted in paths.items()}
+
+    @classmethod
+    def fromfile(cls, filename):
+        """Load a JSON manifest.
+
+        In:
+          - ``filename`` -- path of the manifest
+
+        Return:
+          - the manifest
+        """
+        import json  # Only imported when a manifest is used
+
+        with open(filename, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def get(self, path):
+        return self.paths.get(path.lstrip('/'))
+
+
+class AssetsBundler:
+    """Concatenation of the local css and javascript assets into bundles.
+
+    The bundles are named after the hash of their content and written once
+    into the ``bundles_path`` directory.
+    """
+
+    EXTENSIONS = {'css': '.css', 'javascript': '.js'}
+    SEPARATORS = {'css': b'\n', 'javascript': b';\n'}
+    BUNDLE_NAME = re.compile(r'[0-9a-f]+\.(css|js)')
+    CSS_URL = re.compile(rb"""url\(\s*(['"]?)([^'")]*)\1\s*\)""")
+    # Rules only valid at the beginning of a css
+    CSS_LEADING_RULES = re.compile(rb'@(?:import|charset)\b', re.I)
+
+    def __init__(self, static_url, static_path, bundles_path, bundles_url=None, cache_size=1024, stat_interval=0):
+        """Initialization.
+
+        In:
+          - ``static_url`` -- URL prefix of the local assets
+          - ``static_path`` -- directory of the local assets
+          - ``bundles_path`` -- directory where the bundles are written
+          - ``bundles_url`` -- URL prefix of the bundles (``<static_url>/bundles`` by default)
+          - ``cache_size`` -- number of assets lists whose bundle URL is memorized
+          - ``stat_interval`` -- minimum number of seconds between two checks of the assets files
+        """
+        self.static_url = (static_url or '').rstrip('/') + '/'
+        self.static_path = os.path.abspath(static_path)
+        self.bundles_path = bundles_path
+        self.bundles_url = (bundles_url or (self.static_url + 'bundles')).rstrip('/')
+
+        self.stat_interval = stat_interval
+
+        self._bundles = LRUCache(cache_size)
+        self._assets = {}  # (kind, URL) -> ((path, modification time), bundleable, last check time)
+
+    def asset_path(self, url):
+        """Location of a local asset.
+
+        In:
+          - ``url`` -- absolute URL of the asset
+
+        Return:
+          - the path of the asset file or ``None`` if the asset is not local
+        """
+        parts = urlparse.urlparse(url)
+        if parts.scheme or parts.netloc or not parts.path.startswith(self.static_url):
+            return None
+
+        path = urlparse.unquote(parts.path[len(self.static_url) :])
+        path = os.path.normpath(os.path.join(self.static_path, path))
+
+        return path if path.startswith(self.static_path + os.sep) and os.path.isfile(path) else None
+
+    def bundle_path(self, name):
+        """Location of a bundle, for the web layer to serve it.
+
+        In:
+          - ``name`` -- name of the bundle (last part of its URL)
+
+        Return:
+          - the path of the bundle file or ``None`` if the bundle doesn't exist
+        """
+        path = os.path.join(self.bundles_path, name)
+        return path if self.BUNDLE_NAME.fullmatch(name) and os.path.isfile(path) else None
+
+    @classmethod
+    def rewrite_css_urls(cls, url, css):
+        """Make the relative URLs of a css absolute, before it's moved into a bundle.
+
+        In:
+          - ``url`` -- URL of the css
+          - ``css`` -- content of the css
+
+        Return:
+          - the new content
+        """
+
+        def rewrite(match):
+            quote, ref = match.groups()
+            if not ref or ref.startswith((b'/', b'#', b'data:')) or (b':' in ref.split(b'/', 1)[0]):
+                return match.group(0)
+
+            return b'url(%s%s%s)' % (quote, urlparse.urljoin(url, ref.decode('latin-1')).encode('latin-1'), quote)
+
+        return cls.CSS_URL.sub(rewrite, css)
+
+    def bundleable(self, kind, path):
+        """Can an asset be concatenated with others?
+
+        The css with ``@import`` or ``@charset`` rules are kept out of the bundles.
+
+        In:
+          - ``kind`` -- ``css`` or ``javascript``
+          - ``path`` -- path of the asset file
+
+        Return:
+          - boolean
+        """
+        if kind != 'css':
+            return True
+
+        with open(path, 'rb') as f:
+            return not self.CSS_LEADING_RULES.search(f.read())
+
+    def _local_asset(self, kind, url, now):
+        entry = self._assets.get((kind, url))
+        if (entry is not None) and ((now - entry[2]) < self.stat_interval):
+            asset, bundleable, _ = entry
+        else:
+            path = self.asset_path(url)
+            asset = (path, os.stat(path).st_mtime_ns) if path is not None else None
+
+            if (entry is not None) and (entry[0] == asset):
+                bundleable = entry[1]
+            else:
+                bundleable = (asset is not None) and self.bundleable(kind, path)
+
+            self._assets[(kind, url)] = (asset, bundleable, now)
+
+        return asset if bundleable else None
+
+    def _build(self, kind, assets):
+        import hashlib  # Only imported when the assets are bundled
+
+        contents = []
+        for url, path, _ in assets:
+            with open(path, 'rb') as f:
+                content = f.read()
+
+            contents.append(self.rewrite_css_urls(url, content) if kind == 'css' else content)
+
+        content = self.SEPARATORS[kind].join(contents)
+        name = hashlib.sha256(content).hexdigest()[:20] + self.EXTENSIONS[kind]
+        path = os.path.join(self.bundles_path, name)
+
+        if not os.path.isfile(path):
+            os.makedirs(self.bundles_path, exist_ok=True)
+
+            tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+
+        return self.bundles_url + '/' + name
+
+    def bundle(self, kind, urls):
+        """Replace the consecutive local assets with the same attributes by their bundle.
+
+        In:
+          - ``kind`` -- ``css`` or ``javascript``
+          - ``urls`` -- list of the (absolute URL, attributes) of the assets
+
+        Return:
+          - list of the (absolute URL, attributes) of the assets and bundles
+        """
+        now = time.time()
+        assets = [(url, attributes, self._local_asset(kind, url, now)) for url, attributes in urls]
+
+        bundled = []
+        for (local, attributes), group in itertools.groupby(assets, lambda asset: (bool(asset[2]), asset[1])):
+            group = list(group)
+
+            if local and (len(group) > 1):
+                key = tuple((url, path, mtime) for url, _, (path, mtime) in group)
+                bundled.append((self._bundles.get((kind, key), self._build, kind, key), attributes))
+            else:
+                bundled.extend((url, attributes) for url, attributes, _ in group)
+
+        return bundled
+
+
+class AssetsIntegrity:
+    """Subresource Integrity of the local assets.
+
+    The hashes are read from a prebuilt manifest or computed from the files
+    then memorized, until the files are modified.
+    """
+
+    ALGORITHMS = ('sha256', 'sha384', 'sha512')
+
+    def __init__(self, locations, hashes=None, algorithm='sha384', cache_size=1024):
+        """Initialization.
+
+        In:
+          - ``locations`` -- dictionary of the URL prefixes of the local assets to their directories
+          - ``hashes`` -- dictionary of the assets paths, relative to their directory, to their
+            prebuilt integrity values
+          - ``algorithm`` -- hash algorithm of the computed integrity values
+          - ``cache_size`` -- number of computed integrity values memorized
+        """
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError('invalid integrity algorithm %r' % algorithm)
+
+        self.locations = sorted(
+            ((url.rstrip('/') + '/', os.path.abspath(path)) for url, path in locations.items()),
+            key=lambda location: len(location[0]),
+            reverse=True,
+        )
+        self.hashes = {path.lstrip('/'): integrity for path, integrity in (hashes or {}).items()}
+        self.algorithm = algorithm
+
+        self._integrities = LRUCache(cache_size)
+
+    @classmethod
+    def fromfile(cls, locations, filename, algorithm='sha384', cache_size=1024):
+        """Load a JSON manifest of the prebuilt integrity values.
+
+        In:
+          - ``locations`` -- dictionary of the URL prefixes of the local assets to their directories
+          - ``filename`` -- path of the manifest
+
+        Return:
+          - the assets integrity
+        """
+        import json  # Only imported when a manifest is used
+
+        with open(filename, encoding='utf-8') as f:
+            return cls(locations, json.load(f), algorithm, cache_size)
+
+    def _compute(self, path, mtime, size):
+        import base64
+        import hashlib  # Only imported when the integrity values are computed
+
+        h = hashlib.new(self.algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                h.update(chunk)
+
+        return self.algorithm + '-' + base64.b64encode(h.digest()).decode('ascii')
+
+    def get(self, url):
+        """Integrity value of an asset.
+
+        In:
+          - ``url`` -- absolute URL of the asset
+
+        Return:
+          - the integrity value or ``None`` if the asset is not local
+        """
+        url = url.split('#', 1)[0].split('?', 1)[0]
+
+        for url_prefix, directory in self.locations:
+            if url.startswith(url_prefix):
+                relative_path = urlparse.unquote(url[len(url_prefix) :])
+
+                integrity = self.hashes.get(relative_path)
+                if integrity is not None:
+                    return integrity
+
+                path = os.path.normpath(os.path.join(directory, relative_path))
+                if not path.startswith(directory + os.sep):
+                    return None
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return None
+
+                key = (path, stat.st_mtime_ns, stat.st_size)
+                return self._integrities.get(key, self._compute, *key)
+
+        return None
+
+    def attributes(self, url, attributes):
+        """Add the ``integrity`` attribute of a local asset.
+
+        The ``crossorigin`` attribute, mandatory for the cross-origin assets, is added too.
+
+        In:
+          - ``url`` -- absolute URL of the asset
+          - ``attributes`` -- attributes of the asset tag
+
+        Return:
+          - the new attributes
+        """
+        if 'integrity' in attributes:
+            return attributes
+
+        integrity = self.get(url)
+        if integrity is None:
+            return attributes
+
+        attributes = dict(attributes, integrity=integrity)
+        if urlparse.urlparse(url).netloc:
+            attributes.setdefault('crossorigin', 'anonymous')
+
+        return attributes
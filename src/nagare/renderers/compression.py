@@ -0,0 +1,153 @@
+# --
+# Copyright (c) 2014-2026 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Streaming compressions of the serializations."""
+
+import abc
+import zlib
+import struct
+
+# ---------------------------------------------------------------------------
+
+
+class Compressor(abc.ABC):
+    """Streaming compression of a serialization.
+
+    Only ``compress()`` and ``flush()`` must be implemented, to plug any compression.
+    The static fragments are compressed once then reused only if ``compress_fragment()``
+    is implemented too, with ``fragment_key`` identifying the compressor settings.
+    """
+
+    content_encoding = None
+    fragment_key = None
+
+    def header(self):
+        return b''
+
+    @abc.abstractmethod
+    def compress(self, data):
+        pass
+
+    def compress_fragment(self, data):
+        """Compress a static fragment, independently of the stream.
+
+        In:
+          - ``data`` -- the serialized fragment
+
+        Return:
+          - the compressed fragment, to be given to ``splice()``, or ``None`` if not reusable
+        """
+        return None
+
+    def splice(self, data, fragment):
+        """Insert a compressed static fragment into the stream.
+
+        In:
+          - ``data`` -- the serialized fragment
+          - ``fragment`` -- the result of ``compress_fragment()``
+
+        Return:
+          - the compressed data
+        """
+        return self.compress(data)
+
+    @abc.abstractmethod
+    def flush(self):
+        pass
+
+
+class DeflateCompressor(Compressor):
+    """Raw deflate compression.
+
+    The static fragments are compressed then sync-flushed with a fresh compressor,
+    and the stream is fully flushed before each of them. This way the compressed
+    fragments never refer to data outside of them and can be copied as is.
+    """
+
+    def __init__(self, level=6):
+        self.level = level
+        self.compressor = self.create_compressor()
+
+    @property
+    def fragment_key(self):
+        return DeflateCompressor, self.level
+
+    def create_compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def compress_fragment(self, data):
+        compressor = self.create_compressor()
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def splice(self, data, fragment):
+        return self.compressor.flush(zlib.Z_FULL_FLUSH) + fragment if fragment is not None else self.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class GzipCompressor(DeflateCompressor):
+    """The ``gzip`` content encoding."""
+
+    content_encoding = 'gzip'
+
+    def __init__(self, level=6):
+        super().__init__(level)
+        self.crc = self.size = 0
+
+    def header(self):
+        return b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+    def compress(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+
+        return super().compress(data)
+
+    def splice(self, data, fragment):
+        if fragment is None:
+            return self.compress(data)
+
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+
+        return super().splice(data, fragment)
+
+    def flush(self):
+        return super().flush() + struct.pack('<II', self.crc, self.size & 0xFFFFFFFF)
+
+
+class ZlibCompressor(DeflateCompressor):
+    """The ``deflate`` content encoding."""
+
+    content_encoding = 'deflate'
+
+    def __init__(self, level=6):
+        super().__init__(level)
+        self.adler = 1
+
+    def header(self):
+        return b'\x78\x9c'
+
+    def compress(self, data):
+        self.adler = zlib.adler32(data, self.adler)
+        return super().compress(data)
+
+    def splice(self, data, fragment):
+        if fragment is None:
+            return self.compress(data)
+
+        self.adler = zlib.adler32(data, self.adler)
+        return super().splice(data, fragment)
+
+    def flush(self):
+        return super().flush() + struct.pack('>I', self.adler)
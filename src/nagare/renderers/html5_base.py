@@ -25,6 +25,7 @@ class Renderer(html_base.Renderer):
     """The XHTML5 synchronous renderer."""
 
     doctype = '<!DOCTYPE html>'
+    html5_syntax = True
 
     # New HTML5 tags
     # --------------
@@ -42,7 +43,8 @@ class Renderer(html_base.Renderer):
     time = TagProp('time')
     video = TagProp('video')
     audio = TagProp('audio')
-    source = TagProp('source')
+    source = TagProp('source', None, html_base.Source)
+    picture = TagProp('picture')
     embed = TagProp('embed')
     mark = TagProp('mark')
     meta = TagProp('meta')
@@ -77,3 +79,56 @@ class Renderer(html_base.Renderer):
     applet = ObsoleteTagProp('applet')
     isindex = ObsoleteTagProp('isindex')
     dir = ObsoleteTagProp('dir')
+
+    # Loading policy
+    # --------------
+
+    # Number of the first images and iframes, in document order, loaded eagerly.
+    # The next ones are lazy loaded and decoded asynchronously. No policy if ``None``
+    eager_loading = None
+    # Number of the first eager images fetched with a high priority
+    high_priority_images = 1
+
+    def apply_loading_policy(self, root=None):
+        """Set the ``loading``, ``decoding`` and ``fetchpriority`` attributes of the images and iframes.
+
+        The attributes explicitly set are kept.
+
+        In:
+          - ``root`` -- the tree to update (the root of this renderer by default)
+        """
+        if self.eager_loading is None:
+            return
+
+        roots = self.root if root is None else root
+
+        position = images = 0
+        for tree in roots if isinstance(roots, (list, tuple)) else [roots]:
+            if not isinstance(tree, html_base.Tag):
+                continue
+
+            for tag in tree.iter('img', 'iframe'):
+                is_img = tag.tag == 'img'
+
+                if position >= self.eager_loading:
+                    if tag.get('loading') is None:
+                        tag.set('loading', 'lazy')
+
+                    if is_img and (tag.get('decoding') is None):
+                        tag.set('decoding', 'async')
+                elif is_img and (images < self.high_priority_images) and (tag.get('loading') != 'lazy'):
+                    if tag.get('fetchpriority') is None:
+                        tag.set('fetchpriority', 'high')
+
+                    # The images with an explicit lower priority don't count
+                    images += tag.get('fetchpriority') == 'high'
+
+                position += 1
+
+    def stream(self, root=None, *args, **kw):
+        self.apply_loading_policy(root)
+        return super().stream(root, *args, **kw)
+
+    def write_to(self, writable, root=None, *args, **kw):
+        self.apply_loading_policy(root)
+        return super().write_to(writable, root, *args, **kw)
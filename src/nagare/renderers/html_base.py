@@ -14,14 +14,26 @@ Having not dependencies to the Nagare framework make it suitable to be used in
 others frameworks.
 """
 
+import os
+import re
+import copy
+import mmap
+import time
+import heapq
+import functools
+import itertools
+import threading
 import urllib.parse as urlparse
-from collections import OrderedDict
+from operator import attrgetter
+from contextlib import contextmanager
+from collections.abc import Mapping
 
-from lxml import html
 from lxml import etree as ET
 
 from nagare.renderers import xml
 from nagare.renderers.xml import TagProp
+from nagare.renderers.assets import LRUCache, AssetsBundler, AssetsManifest, AssetsIntegrity  # noqa: F401
+from nagare.renderers.compression import Compressor, GzipCompressor, ZlibCompressor, DeflateCompressor  # noqa: F401
 
 # ---------------------------------------------------------------------------
 
@@ -29,22 +41,202 @@ from nagare.renderers.xml import TagProp
 # Common attributes
 # -----------------
 
-componentattrs = {'id', 'class', 'style', 'title'}
-i18nattrs = {'lang', 'dir'}
-eventattrs = {
-    'onclick',
-    'ondblclick',
-    'onmousedown',
-    'onmouseup',
-    'onmousemove',
-    'onmouseover',
-    'onmouseout',
-    'onkeypress',
-    'onkeydown',
-    'onkeyup',
-}
+componentattrs = frozenset({'id', 'class', 'style', 'title'})
+i18nattrs = frozenset({'lang', 'dir'})
+eventattrs = frozenset(
+    {
+        'onclick',
+        'ondblclick',
+        'onmousedown',
+        'onmouseup',
+        'onmousemove',
+        'onmouseover',
+        'onmouseout',
+        'onkeypress',
+        'onkeydown',
+        'onkeyup',
+    }
+)
 allattrs = componentattrs | i18nattrs | eventattrs
-focusattrs = {'accesskey', 'tabindex', 'onfocus', 'onblur'}
+focusattrs = frozenset({'accesskey', 'tabindex', 'onfocus', 'onblur'})
+cellhalignattrs = frozenset({'align', 'char', 'charoff'})
+cellvalignattrs = frozenset({'valign'})
+
+# Combinations shared by several tags
+allfocusattrs = allattrs | focusattrs
+alignattrs = allattrs | {'align'}
+cellattrs = allattrs | cellhalignattrs | cellvalignattrs
+tablecellattrs = cellattrs | {
+    'abbr',
+    'axis',
+    'headers',
+    'scope',
+    'rowspan',
+    'colspan',
+    'nowrap',
+    'bgcolor',
+    'width',
+    'height',
+    'background',
+    'bordercolor',
+}
+
+# Default maximum size of the chunks of a streamed serialization
+CHUNK_SIZE = 64 * 1024
+# Default maximum number of elements of a subtree serialized in one piece
+MAX_ELEMENTS = 1000
+
+# Minification
+# ------------
+
+# Tags whose content whitespaces are significant
+PRESERVE_WHITESPACES = frozenset({'pre', 'textarea', 'script', 'style'})
+# Tags whose whitespace-only texts between children are not rendered
+NO_TEXT_CONTENT = frozenset(
+    {'html', 'head', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'colgroup', 'ul', 'ol', 'dl', 'select', 'optgroup'}
+)
+DEFAULT_ATTRIBUTES = {
+    'script': ('type', 'text/javascript'),
+    'style': ('type', 'text/css'),
+    'link': ('type', 'text/css'),
+}
+BOOLEAN_ATTRIBUTES = frozenset(
+    {
+        'allowfullscreen',
+        'async',
+        'autofocus',
+        'autoplay',
+        'checked',
+        'controls',
+        'default',
+        'defer',
+        'disabled',
+        'formnovalidate',
+        'hidden',
+        'inert',
+        'ismap',
+        'itemscope',
+        'loop',
+        'multiple',
+        'muted',
+        'nomodule',
+        'novalidate',
+        'open',
+        'playsinline',
+        'readonly',
+        'required',
+        'reversed',
+        'selected',
+    }
+)
+
+WHITESPACES = re.compile('[ \t\n\r\f]+')
+# Content of a start tag, with its quoted attributes values
+START_TAG_CONTENT = rb"""(?:[^<>"']|"[^"]*"|'[^']*')*"""
+# Comments, start tags of the raw text elements with their content, and other start tags
+MARKUP = re.compile(
+    rb'<!--.*?(?:-->|$)|(<(?:script|style)\b%s>).*?(?=</(?:script|style)\s*>|$)|<[a-zA-Z]%s>'
+    % (START_TAG_CONTENT, START_TAG_CONTENT),
+    re.S,
+)
+# Quoted attributes values, to be skipped, or empty boolean attributes
+EMPTY_BOOLEAN_ATTRIBUTE = re.compile(
+    rb""""[^"]*"|'[^']*'|\s(%s)=""(?=[\s/>])""" % b'|'.join(name.encode() for name in BOOLEAN_ATTRIBUTES)
+)
+
+# Namespaces declarations at the beginning of a serialization
+START_TAG_NAMESPACES = re.compile(rb'<[^\s/>]+((?:\s+xmlns(?::[^\s=]+)?="[^"]*")+)')
+NAMESPACE_DECLARATION = re.compile(rb'\s+xmlns(?::([^\s=]+))?="[^"]*"')
+
+# ---------------------------------------------------------------------------
+
+
+def _collapse_whitespaces(text, drop_blank):
+    if not text:
+        return text
+
+    if drop_blank and WHITESPACES.fullmatch(text):
+        return None
+
+    return WHITESPACES.sub(' ', text)
+
+
+def _minify(element, html5):
+    if html5:
+        default = DEFAULT_ATTRIBUTES.get(element.tag)
+        if default and (element.get(default[0], '').lower() == default[1]):
+            del element.attrib[default[0]]
+
+        for name in BOOLEAN_ATTRIBUTES.intersection(element.attrib):
+            element.set(name, '')
+
+    if element.tag in PRESERVE_WHITESPACES:
+        return
+
+    drop_blank = element.tag in NO_TEXT_CONTENT
+    element.text = _collapse_whitespaces(element.text, drop_blank)
+
+    for child in element:
+        if isinstance(child.tag, str):
+            _minify(child, html5)
+
+        child.tail = _collapse_whitespaces(child.tail, drop_blank)
+
+
+def _own_namespaces(element):
+    """Namespaces declared by an element itself, not inherited from its ancestors."""
+    namespaces = []
+    for event, namespace in ET.iterwalk(element, events=('start-ns', 'start')):
+        if event == 'start':
+            break
+
+        namespaces.append((namespace[0] or None, namespace[1]))
+
+    return namespaces
+
+
+def _strip_inherited_namespaces(element, serialization, namespaces=None):
+    """Remove the namespaces declarations added to the serialization of a subtree.
+
+    In:
+      - ``element`` -- root of the subtree
+      - ``serialization`` -- serialization of the subtree
+      - ``namespaces`` -- namespaces declared by the element itself (see ``_own_namespaces()``)
+
+    Return:
+      - the serialization the subtree has in the whole tree
+    """
+    if not isinstance(serialization, bytes) or not element.nsmap:
+        return serialization
+
+    match = START_TAG_NAMESPACES.match(serialization)
+    if match is None:
+        return serialization
+
+    prefixes = {prefix for prefix, _ in (_own_namespaces(element) if namespaces is None else namespaces)}
+    declarations = [
+        declaration.group(0)
+        for declaration in NAMESPACE_DECLARATION.finditer(match.group(1))
+        if (declaration.group(1) and declaration.group(1).decode('ascii')) in prefixes
+    ]
+
+    return serialization[: match.start(1)] + b''.join(declarations) + serialization[match.end(1) :]
+
+
+def _shorten_boolean_attribute(match):
+    name = match.group(1)
+    return match.group(0) if name is None else (b' ' + name)
+
+
+def _shorten_boolean_attributes(match):
+    markup = match.group(0)
+    if markup.startswith(b'<!'):
+        return markup
+
+    # The content of the raw text elements is kept as is
+    start_tag = match.group(1) or markup
+    return EMPTY_BOOLEAN_ATTRIBUTE.sub(_shorten_boolean_attribute, start_tag) + markup[len(start_tag) :]
+
 
 # ---------------------------------------------------------------------------
 
@@ -87,12 +279,320 @@ def absolute_url(url, url_prefix, always_relative=False, **params):
 absolute_asset_url = absolute_url  # noqa: E305
 
 
+def _absolute_asset_url(url, static_prefix, assets_version, assets_manifest, always_relative, params):
+    url = Url(url)
+    params = dict(params)
+
+    if not url.is_absolute():
+        fingerprinted = None if (assets_manifest is None) or url.is_url() else assets_manifest.get(url.parts[2])
+        if fingerprinted is not None:
+            url.parts[2] = fingerprinted
+        elif assets_version:
+            params.setdefault('ver', assets_version)
+
+    return url.absolute(static_prefix, always_relative, **params)
+
+
+def _cached_absolute_asset_url(cache, url, static_prefix, assets_version, assets_manifest, always_relative, params):
+    key = (url, static_prefix, assets_version, assets_manifest, always_relative, tuple(params.items()))
+
+    try:
+        hash(key)
+    except TypeError:
+        return _absolute_asset_url(*key)
+
+    return cache.get(key, _absolute_asset_url, *key)
+
+
+SRCSET_URL = re.compile(r'[\s,]*(\S+)')
+SRCSET_DESCRIPTOR = re.compile(r'(?:[^,(]|\([^)]*\)?)*')
+
+
+def parse_srcset(srcset):
+    """Parse the value of a ``srcset`` attribute.
+
+    In:
+      - ``srcset`` -- the comma separated image candidates
+
+    Return:
+      - list of the (URL, descriptor) of the candidates
+    """
+    candidates = []
+    position = 0
+
+    while True:
+        match = SRCSET_URL.match(srcset, position)
+        if match is None:
+            break
+
+        url = match.group(1)
+        position = match.end()
+
+        if url.endswith(','):
+            url = url.rstrip(',')
+            descriptor = ''
+        else:
+            match = SRCSET_DESCRIPTOR.match(srcset, position)
+            descriptor = match.group().strip()
+            position = match.end()
+
+        candidates.append((url, descriptor))
+
+    return candidates
+
+
+def rewrite_srcset(srcset, rewrite):
+    """Rewrite the URLs of a ``srcset`` attribute.
+
+    In:
+      - ``srcset`` -- the comma separated image candidates
+      - ``rewrite`` -- function called with each URL and returning the new URL
+
+    Return:
+      - the new ``srcset`` value
+    """
+    return ', '.join(
+        rewrite(url) + (' ' + descriptor if descriptor else '') for url, descriptor in parse_srcset(srcset)
+    )
+
+
+def build_srcset(pattern, sizes, descriptor='w'):
+    """Generate the value of a ``srcset`` attribute.
+
+    In:
+      - ``pattern`` -- URL of the images, with a ``{size}`` placeholder
+        (i.e ``'img/hero-{size}.jpg'`` or ``'img/hero.jpg?width={size}'``)
+      - ``sizes`` -- the widths (or pixel densities) of the images
+      - ``descriptor`` -- ``w`` for widths or ``x`` for pixel densities
+
+    Return:
+      - the ``srcset`` value
+    """
+    return ', '.join('%s %s%s' % (pattern.format(size=size), size, descriptor) for size in sizes)
+
+
+def copy_tree(tree, renderer=None):
+    """Deep copy of a tree.
+
+    In:
+      - ``tree`` -- a tag, a list of tags and strings, or a string
+      - ``renderer`` -- renderer the copied tags are bound to
+
+    Return:
+      - the copy
+    """
+    if isinstance(tree, list):
+        return [copy_tree(element, renderer) for element in tree]
+
+    if not isinstance(tree, ET.ElementBase):
+        return tree
+
+    tree = copy.deepcopy(tree)
+    return tree if renderer is None else tree.init(renderer)
+
+
+def _encode_text(text, encoding):
+    """Escape and encode a text at the top level of a page."""
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').encode(encoding)
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Read a source chunk by chunk.
+
+    In:
+      - ``source`` -- path of a file, read through ``mmap``, or file-like object
+      - ``chunk_size`` -- size of the chunks
+
+    Return:
+      - generator of the chunks
+    """
+    if not isinstance(source, str):
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+
+        return
+
+    with open(source, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            for i in range(0, len(content), chunk_size):
+                yield content[i : i + chunk_size]
+
+
+class ThreadLocalParser:
+    """Descriptor giving a parser to each thread.
+
+    The lxml parsers can't be used concurrently by several threads.
+    """
+
+    def __init__(self, element, parser_factory=ET.HTMLParser, **kw):
+        """Initialization.
+
+        In:
+          - ``element`` -- class of the elements created by the parsers
+          - ``parser_factory`` -- class of the parsers
+          - ``kw`` -- parameters of the parsers creation
+        """
+        self.element = element
+        self.parser_factory = parser_factory
+        self.kw = kw
+
+        self._local = threading.local()
+
+    def __get__(self, renderer, cls):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = self.parser_factory(**self.kw)
+            parser.set_element_class_lookup(ET.ElementDefaultClassLookup(element=self.element))
+
+        return parser
+
+
+class TemplatesCache:
+    """Process-wide cache of the parsed templates files.
+
+    A template is parsed once then invalidated when the modification time of
+    its file changes. Each renderer receives its own copy of the parsed tree.
+    """
+
+    def __init__(self, stat_interval=0):
+        """Initialization.
+
+        In:
+          - ``stat_interval`` -- minimum number of seconds between two checks of the files modification times
+        """
+        self.stat_interval = stat_interval
+        self._templates = {}  # key -> (modification time, last check time, parsed tree)
+
+    def clear(self):
+        self._templates.clear()
+
+    def get(self, renderer, parse, filename, tags_factory, fragment, no_leading_text, **kw):
+        """Return a copy of the parsed template, parsing the file on a miss.
+
+        In:
+          - ``renderer`` -- the renderer the copy is bound to
+          - ``parse`` -- function called with the others parameters to parse the file
+          - ``filename`` -- path of the template
+
+        Return:
+          - the root of the tree or, if ``fragment``, the list of the roots
+        """
+        key = (os.path.abspath(filename), renderer.__class__, tags_factory, fragment, no_leading_text)
+        key += tuple(sorted(kw.items()))
+
+        now = time.time()
+        entry = self._templates.get(key)
+        if entry is not None:
+            mtime, checked, tree = entry
+            if (now - checked) < self.stat_interval:
+                return copy_tree(tree, renderer)
+
+            if os.stat(filename).st_mtime_ns == mtime:
+                self._templates[key] = (mtime, now, tree)
+                return copy_tree(tree, renderer)
+
+        mtime = os.stat(filename).st_mtime_ns
+        tree = parse(filename, tags_factory, fragment, no_leading_text, **kw)
+
+        # Keep an unbound copy of the tree
+        self._templates[key] = (mtime, now, copy_tree(tree))
+
+        return tree
+
+
+# Parsed templates, shared by all the renderers
+templates_cache = TemplatesCache()
+
+
+class Sink:
+    """Writer into a file-like object, a ``bytearray`` or a writable ``memoryview``."""
+
+    def __init__(self, writable):
+        """Initialization.
+
+        In:
+          - ``writable`` -- object with a ``write()`` method, ``bytearray`` (extended)
+            or ``memoryview`` (filled from its beginning)
+        """
+        self.writable = writable
+        self.size = 0  # Number of bytes written
+        self.error = None  # Exception raised by the writer, as lxml swallows it
+
+        if isinstance(writable, bytearray):
+            self._write = writable.extend
+        elif isinstance(writable, memoryview):
+            self._write = self._write_into_memoryview
+        else:
+            self._write = writable.write
+
+    def _write_into_memoryview(self, data):
+        end = self.size + len(data)
+        if end > self.writable.nbytes:
+            raise ValueError('memoryview too small to receive the serialization')
+
+        self.writable[self.size : end] = data
+
+    def write(self, data):
+        try:
+            self._write(data)
+        except Exception as error:
+            self.error = error
+            raise
+
+        self.size += len(data)
+
+
+class StaticChunk(bytes):
+    """Serialization of a static subtree, yielded as a chunk of its own."""
+
+
+def _classes_value(value, add=(), remove=()):
+    classes = [name for name in (value or '').split() if name not in remove]
+    classes.extend(name for name in dict.fromkeys(add) if name not in classes)
+
+    return ' '.join(classes)
+
+
+def update_classes(tags, add=(), remove=()):
+    """Add and remove classes of many tags.
+
+    The new value of the ``class`` attribute is computed once for all the tags
+    sharing the same value.
+
+    In:
+      - ``tags`` -- iterable of tags
+      - ``add`` -- the classes to add
+      - ``remove`` -- the classes to remove
+    """
+    values = {}
+
+    for tag in tags:
+        value = tag.get('class')
+
+        new_value = values.get(value)
+        if new_value is None:
+            new_value = values[value] = _classes_value(value, add, remove)
+
+        if new_value:
+            if new_value != value:
+                tag.set('class', new_value)
+        elif value is not None:
+            del tag.attrib['class']
+
+
 class Tag(xml.Tag):
     """A html tag."""
 
     @property
     def classes(self):
-        return html.Classes(self.attrib)
+        from lxml.html import Classes  # ``lxml.html`` is long to import and only needed here
+
+        return Classes(self.attrib)
 
     @classes.setter
     def classes(self, classes):
@@ -102,17 +602,256 @@ class Tag(xml.Tag):
         elif self.get('class') is not None:
             del self.attrib['class']
 
-    def tostring(self, method='html', encoding='utf-8', pipeline=True, **kw):
+    def _update_classes(self, add=(), remove=()):
+        update_classes((self,), add, remove)
+        return self
+
+    def add_class(self, *names):
+        """Add classes to this tag.
+
+        In:
+          - ``names`` -- the classes
+
+        Return:
+          - ``self``
+        """
+        return self._update_classes(add=names)
+
+    def remove_class(self, *names):
+        """Remove classes from this tag.
+
+        In:
+          - ``names`` -- the classes
+
+        Return:
+          - ``self``
+        """
+        return self._update_classes(remove=names)
+
+    def toggle_class(self, name, state=None):
+        """Add a class to this tag if not present, else remove it.
+
+        In:
+          - ``name`` -- the class
+          - ``state`` -- if not ``None``, add the class if true, else remove it
+
+        Return:
+          - ``self``
+        """
+        if state is None:
+            state = not self.has_class(name)
+
+        return self._update_classes(add=(name,)) if state else self._update_classes(remove=(name,))
+
+    def has_class(self, name):
+        """Test if a class is set on this tag.
+
+        In:
+          - ``name`` -- the class
+
+        Return:
+          - boolean
+        """
+        return name in (self.get('class') or '').split()
+
+    def _apply_loading_policy(self):
+        # The loading policy of a renderer is applied when its root tree is serialized
+        renderer = self.renderer
+        if (self.getparent() is None) and (getattr(renderer, 'eager_loading', None) is not None):
+            roots = renderer.root
+            if any(root is self for root in (roots if isinstance(roots, (list, tuple)) else [roots])):
+                renderer.apply_loading_policy()
+
+    def _html5_syntax(self, method):
+        return (method == 'html') and getattr(self.renderer, 'html5_syntax', False)
+
+    def minified(self, html5=False):
+        """Minified copy of the tree beginning at this tag.
+
+        Outside of ``<pre>``, ``<textarea>``, ``<script>`` and ``<style>``, the whitespaces
+        are collapsed and the whitespace-only texts not rendered are removed.
+
+        In:
+          - ``html5`` -- for the HTML5 syntax, the default ``type`` attributes of the css
+            and javascript tags are removed and the values of the boolean attributes are emptied
+
+        Return:
+          - the minified copy
+        """
+        tag = copy.deepcopy(self)
+        _minify(tag, html5)
+
+        return tag
+
+    def tostring(self, method='html', encoding='utf-8', pipeline=True, minify=False, **kw):
         """Serialize in HTML the tree beginning at this tag.
 
         In:
           - ``encoding`` -- encoding of the XML
           - ``pipeline`` -- if False, the ``meld:id`` attributes are deleted
+          - ``minify`` -- serialize a minified copy of the tree (see ``minified()``), with
+            short boolean attributes for the HTML5 syntax
 
         Return:
           - the HTML
         """
-        return super().tostring(method, encoding, pipeline, **kw)
+        self._apply_loading_policy()
+
+        if not minify:
+            return super().tostring(method, encoding, pipeline, **kw)
+
+        html5 = self._html5_syntax(method)
+
+        html = super(Tag, self.minified(html5)).tostring(method, encoding, pipeline, **kw)
+        if html5 and isinstance(html, bytes):
+            html = MARKUP.sub(_shorten_boolean_attributes, html)
+
+        return html
+
+    def _is_small(self, max_elements):
+        return sum(1 for _ in itertools.islice(self.iter(), max_elements + 1)) <= max_elements
+
+    def _iter_serialize(self, method, encoding, pipeline, depth, max_elements, statics=(), opened=(), **kw):
+        if self in statics:
+            yield StaticChunk(_strip_inherited_namespaces(self, self.tostring(method, encoding, pipeline, **kw)))
+            return
+
+        if ((depth <= 0) and (self not in opened) and self._is_small(max_elements)) or not len(self):
+            yield _strip_inherited_namespaces(self, self.tostring(method, encoding, pipeline, **kw))
+            return
+
+        # Serialize this tag without its children to get its start and end tags,
+        # with the prefixes of the namespaces in scope but only its own declarations
+        namespaces = _own_namespaces(self)
+        nsmap = dict(namespaces)
+        nsmap.update((prefix, uri) for prefix, uri in self.nsmap.items() if prefix not in nsmap)
+
+        tag = self.makeelement(self.tag, self.attrib, nsmap)
+        tag.text = self.text or ''
+        tag.tail = self.tail
+        tag = _strip_inherited_namespaces(self, tag.tostring(method, encoding, pipeline, **kw), namespaces)
+        end = tag.rfind(b'</')
+
+        yield tag[:end]
+
+        for child in self:
+            if isinstance(child, Tag):
+                yield from child._iter_serialize(
+                    method, encoding, pipeline, depth - 1, max_elements, statics, opened, **kw
+                )
+            elif isinstance(child, xml.Tag):
+                yield _strip_inherited_namespaces(child, child.tostring(method, encoding, pipeline, **kw))
+            else:
+                yield ET.tostring(child, method=method, encoding=encoding)
+
+        yield tag[end:]
+
+    def iter_serialize(
+        self,
+        method='html',
+        encoding='utf-8',
+        pipeline=True,
+        chunk_size=CHUNK_SIZE,
+        depth=3,
+        max_elements=MAX_ELEMENTS,
+        minify=False,
+        statics=(),
+        **kw,
+    ):
+        """Serialize in HTML the tree beginning at this tag, chunk by chunk.
+
+        The tags of the first ``depth`` levels of the tree, then the tags of the
+        bigger subtrees whatever their depth, are opened and their children serialized
+        one by one, so the whole HTML is never built in memory.
+
+        In:
+          - ``encoding`` -- encoding of the HTML
+          - ``pipeline`` -- if False, the ``meld:id`` attributes are deleted
+          - ``chunk_size`` -- maximum size of the chunks
+          - ``depth`` -- number of levels of the tree serialized child by child
+          - ``max_elements`` -- maximum number of elements of a subtree serialized in one piece
+          - ``minify`` -- serialize a minified copy of the tree (see ``minified()``), with
+            short boolean attributes for the HTML5 syntax
+          - ``statics`` -- the static subtrees, each one yielded as a ``StaticChunk`` of its own
+            (not with ``minify``, as the minified tree is a copy)
+
+        Return:
+          - generator of the encoded chunks of the HTML
+        """
+        if method == 'xml':
+            kw.setdefault('xml_declaration', False)
+
+        self._apply_loading_policy()
+
+        chunks = []
+        size = 0
+
+        shorten_boolean_attributes = minify and self._html5_syntax(method)
+        tag = self.minified(shorten_boolean_attributes) if minify else self
+
+        # The ancestors of the static subtrees are always opened, whatever their depth
+        opened = {ancestor for static in statics for ancestor in static.iterancestors()}
+
+        for chunk in tag._iter_serialize(method, encoding, pipeline, depth, max_elements, statics, opened, **kw):
+            if isinstance(chunk, StaticChunk):
+                if size:
+                    yield b''.join(chunks)
+                    chunks = []
+                    size = 0
+
+                yield chunk
+                continue
+
+            if shorten_boolean_attributes and isinstance(chunk, bytes):
+                chunk = MARKUP.sub(_shorten_boolean_attributes, chunk)
+
+            chunks.append(chunk)
+            size += len(chunk)
+
+            if size >= chunk_size:
+                chunk = b''.join(chunks)
+                end = size - size % chunk_size
+
+                for i in range(0, end, chunk_size):
+                    yield chunk[i : i + chunk_size]
+
+                chunks = [chunk[end:]]
+                size -= end
+
+        if size:
+            yield b''.join(chunks)
+
+    def write_to(self, writable, encoding='utf-8', method='html', pipeline=True, doctype=None):
+        """Serialize the tree beginning at this tag directly into a writer.
+
+        In:
+          - ``writable`` -- file-like object, ``bytearray`` or writable ``memoryview``
+          - ``encoding`` -- encoding of the HTML
+          - ``method`` -- ``html`` or ``xml``
+          - ``pipeline`` -- if False, the ``meld:id`` attributes are deleted
+          - ``doctype`` -- optional doctype written first
+
+        Return:
+          - number of bytes written
+        """
+        sink = writable if isinstance(writable, Sink) else Sink(writable)
+        self._apply_loading_policy()
+
+        if not pipeline:
+            # The ``meld:id`` attributes are removed by ``tostring()``
+            if doctype:
+                sink.write((doctype + '\n').encode(encoding))
+            sink.write(self.tostring(method, encoding, pipeline))
+        else:
+            with (ET.htmlfile if method == 'html' else ET.xmlfile)(sink, encoding=encoding) as f:
+                if doctype:
+                    f.write_doctype(doctype)
+                f.write(self)
+
+            if sink.error is not None:
+                raise sink.error
+
+        return sink.size
 
     def error(self, msg, classes=''):
         """Mark this tag as erroneous.
@@ -153,7 +892,23 @@ class SrcAttribute(HrefAttribute):
 Embed = Input = Script = SrcAttribute  # noqa: E305
 
 
-class Img(SrcAttribute):
+class SrcsetAttribute(Tag):
+    def absolute_url(self, url):
+        return self.renderer.absolute_asset_url(url)
+
+    def on_change(self):
+        super().on_change()
+
+        srcset = self.get('srcset', None)
+        if srcset is not None:
+            self.set('srcset', rewrite_srcset(srcset, self.absolute_url))
+
+
+# The ``src`` of a ``<source>`` is a media URL, not an asset URL
+Source = SrcsetAttribute  # noqa: E305
+
+
+class Img(SrcsetAttribute, SrcAttribute):
     def on_change(self):
         super().on_change()
 
@@ -162,6 +917,83 @@ class Img(SrcAttribute):
             self.set('lowsrc', self.renderer.absolute_asset_url(url))
 
 
+class Asset:
+    """A registered css or javascript."""
+
+    __slots__ = ('index', 'key', 'data', 'attributes', 'bottom')
+
+    def __init__(self, index, key, data, attributes, bottom):
+        self.index = index  # Registration order
+        self.key = key  # Name or URL
+        self.data = data  # Code of a named css or javascript
+        self.attributes = attributes
+        self.bottom = bottom
+
+
+class AssetsRegistry(Mapping):
+    """Registered assets of a kind, in registration order.
+
+    The assets are partitioned between the ``top`` and the ``bottom`` lists
+    when registered, so a rendering only walks the assets it emits.
+    """
+
+    __slots__ = ('named', '_assets', 'top', 'bottom')
+
+    def __init__(self, named):
+        """Initialization.
+
+        In:
+          - ``named`` -- are the assets named css or javascript codes, or URLs?
+        """
+        self.named = named
+
+        self._assets = {}
+        self.top = []
+        self.bottom = []
+
+    def __getitem__(self, key):
+        asset = self._assets[key]
+        return (asset.data, asset.attributes, asset.bottom) if self.named else (asset.attributes, asset.bottom)
+
+    def __iter__(self):
+        return iter(self._assets)
+
+    def __len__(self):
+        return len(self._assets)
+
+    def assets(self):
+        return self._assets.values()
+
+    def clear(self):
+        self._assets.clear()
+        self.top.clear()
+        self.bottom.clear()
+
+    def add(self, key, data, attributes, bottom):
+        """Register an asset, if not already registered.
+
+        In:
+          - ``key`` -- name or URL of the asset
+          - ``data`` -- code of a named asset
+          - ``attributes`` -- attributes of the generated tag
+          - ``bottom`` -- is the asset rendered at the bottom of the page?
+        """
+        if key not in self._assets:
+            asset = self._assets[key] = Asset(len(self._assets), key, data, attributes, bottom)
+            (self.bottom if bottom else self.top).append(asset)
+
+    def bottom_since(self, nb_top):
+        """The bottom assets and the top assets registered after the first ``nb_top`` ones.
+
+        Return:
+          - the assets, in registration order
+        """
+        if nb_top >= len(self.top):
+            return self.bottom
+
+        return list(heapq.merge(self.bottom, self.top[nb_top:], key=attrgetter('index')))
+
+
 class HeadRenderer(xml.XmlRenderer):
     """The HTML head Renderer.
 
@@ -179,27 +1011,63 @@ class HeadRenderer(xml.XmlRenderer):
     style = TagProp('style', i18nattrs | {'id', 'media', 'type'})
     script = TagProp('script', i18nattrs | {'id', 'async', 'charset', 'defer', 'src', 'type'}, Script)
 
-    _parser = ET.HTMLParser()
-    _parser.set_element_class_lookup(ET.ElementDefaultClassLookup(element=Tag))
+    _parser = ThreadLocalParser(Tag)
+    templates_cache = templates_cache
+
+    # Rewritten assets URLs, shared by all the head renderers
+    assets_url_cache = LRUCache(1024)
 
-    def __init__(self, static_url=None, assets_version=None):
+    def __init__(self, static_url=None, assets_version=None, bundler=None, assets_manifest=None, assets_integrity=None):
         """Renderer initialisation.
 
         The ``HeadRenderer`` keeps track of the javascript and css used by every views,
         to be able to concatenate them into the ``<head>`` section.
+
+        In:
+          - ``bundler`` -- optional ``AssetsBundler`` concatenating the local css and javascript URLs
+          - ``assets_manifest`` -- optional ``AssetsManifest`` of the fingerprinted assets. The assets
+            not in the manifest are versioned with ``assets_version``
+          - ``assets_integrity`` -- optional ``AssetsIntegrity`` adding the ``integrity`` attribute to
+            the local css and javascript URLs
+        """
+        self._named_css = AssetsRegistry(True)  # CSS code
+        self._css_url = AssetsRegistry(False)  # CSS URLs
+        self._named_javascript = AssetsRegistry(True)  # Javascript code
+        self._javascript_url = AssetsRegistry(False)  # Javascript URLs
+
+        self.reset(static_url, assets_version, bundler, assets_manifest, assets_integrity)
+
+    def reset(self, static_url=None, assets_version=None, bundler=None, assets_manifest=None, assets_integrity=None):
+        """Forget the registered assets and the built tags, to reuse this renderer.
+
+        In:
+          - same parameters as the renderer initialisation
+
+        Return:
+          - ``self``
         """
         super().__init__()
 
         # Directory where the static contents of the application are located
         self.static_url = static_url
         self.assets_version = assets_version
+        self.assets_manifest = assets_manifest
+        self.bundler = bundler
+        self.assets_integrity = assets_integrity
+
+        for registry in self._registries():
+            registry.clear()
+
+        self._flushed = None  # Number of top assets of each kind rendered by ``flush_top()``
 
-        self._named_css = OrderedDict()  # CSS code
-        self._css_url = OrderedDict()  # CSS URLs
-        self._named_javascript = OrderedDict()  # Javascript code
-        self._javascript_url = OrderedDict()  # Javascript URLs
+        return self
 
     def fromfile(self, source, tags_factory=Tag, fragment=False, no_leading_text=False, **kw):
+        if isinstance(source, str) and (self.templates_cache is not None):
+            return self.templates_cache.get(
+                self, super().fromfile, source, tags_factory, fragment, no_leading_text, **kw
+            )
+
         return super().fromfile(source, tags_factory, fragment, no_leading_text, **kw)
 
     def fromstring(self, text, tags_factory=Tag, fragment=False, no_leading_text=False, **kw):
@@ -210,12 +1078,36 @@ class HeadRenderer(xml.XmlRenderer):
         return absolute_url(url, url_prefix, always_relative, **params)
 
     def absolute_asset_url(self, url, static_prefix=None, always_relative=False, **params):
-        url = Url(url)
+        return _cached_absolute_asset_url(
+            self.assets_url_cache,
+            url,
+            static_prefix if static_prefix is not None else self.static_url,
+            self.assets_version,
+            self.assets_manifest,
+            always_relative,
+            params,
+        )
+
+    def _registries(self):
+        return self._css_url, self._javascript_url, self._named_css, self._named_javascript
+
+    def assets(self):
+        """Snapshot of the registered assets.
 
-        if self.assets_version and not url.is_absolute():
-            params.setdefault('ver', self.assets_version)
+        Return:
+          - the assets, to be registered again with ``add_assets()``
+        """
+        return tuple(tuple(registry.assets()) for registry in self._registries())
 
-        return url.absolute(static_prefix if static_prefix is not None else self.static_url, always_relative, **params)
+    def add_assets(self, assets):
+        """Register again assets returned by ``assets()``.
+
+        In:
+          - ``assets`` -- the assets
+        """
+        for registry, registry_assets in zip(self._registries(), assets):
+            for asset in registry_assets:
+                registry.add(asset.key, asset.data, asset.attributes, asset.bottom)
 
     def css(self, id_, style, bottom=False, **attributes):
         """Memorize an in-line named css style.
@@ -225,7 +1117,7 @@ class HeadRenderer(xml.XmlRenderer):
           - ``style`` -- the css style
           - ``attributes`` -- attributes of the generated ``<style>`` tag
         """
-        self._named_css.setdefault(id_, (style, attributes, bottom))
+        self._named_css.add(id_, style, attributes, bottom)
         return ''  # In case of erroneous use as in `h << h.css('...')` instead of only `h.css('...')`
 
     def css_url(self, url, bottom=False, url_params=None, **attributes):
@@ -235,7 +1127,7 @@ class HeadRenderer(xml.XmlRenderer):
           - ``url`` -- the css style URL
           - ``attributes`` -- attributes of the generated ``<link>`` tag
         """
-        self._css_url.setdefault(self.absolute_asset_url(url, **(url_params or {})), (attributes, bottom))
+        self._css_url.add(self.absolute_asset_url(url, **(url_params or {})), None, attributes, bottom)
         return ''
 
     def javascript(self, id_, script, bottom=False, **attributes):
@@ -246,7 +1138,7 @@ class HeadRenderer(xml.XmlRenderer):
           - ``script`` -- the javascript code
           - ``attributes`` -- attributes of the generated ``<script>`` tag
         """
-        self._named_javascript.setdefault(id_, (script, attributes, bottom))
+        self._named_javascript.add(id_, script, attributes, bottom)
         return ''
 
     def javascript_url(self, url, bottom=False, url_params=None, **attributes):
@@ -259,9 +1151,99 @@ class HeadRenderer(xml.XmlRenderer):
         Return:
           - ``()``
         """
-        self._javascript_url.setdefault(self.absolute_asset_url(url, **(url_params or {})), (attributes, bottom))
+        self._javascript_url.add(self.absolute_asset_url(url, **(url_params or {})), None, attributes, bottom)
         return ''
 
+    def _bundle(self, kind, assets, bundle=True):
+        urls = [(asset.key, asset.attributes) for asset in assets]
+        if bundle and (self.bundler is not None):
+            urls = self.bundler.bundle(kind, urls)
+
+        if self.assets_integrity is not None:
+            urls = [(url, self.assets_integrity.attributes(url, attributes)) for url, attributes in urls]
+
+        return urls
+
+    def _render_css_urls(self, assets, bundle=True):
+        return [
+            self.link(rel='stylesheet', type='text/css', href=url, **attributes)
+            for url, attributes in self._bundle('css', assets, bundle)
+        ]
+
+    def _render_javascript_urls(self, assets, bundle=True):
+        return [
+            self.script(type='text/javascript', src=url, **attributes)
+            for url, attributes in self._bundle('javascript', assets, bundle)
+        ]
+
+    def _render_named_css(self, assets):
+        return [
+            self.style(asset.data, type='text/css', data_nagare_css=asset.key, **asset.attributes) for asset in assets
+        ]
+
+    def _render_named_javascript(self, assets):
+        return [
+            self.script(asset.data, type='text/javascript', data_nagare_js=asset.key, **asset.attributes)
+            for asset in assets
+        ]
+
+    @staticmethod
+    def _preload_link(url, as_, attributes):
+        module = attributes.get('type') == 'module'
+        link = ['<%s>' % url, 'rel=modulepreload' if module else 'rel=preload; as=' + as_]
+
+        for name in ('crossorigin', 'integrity', 'media', 'nonce'):
+            value = attributes.get(name)
+            if value in ('', True):
+                link.append(name)
+            elif value is not None:
+                link.append('%s="%s"' % (name, value))
+
+        return '; '.join(link)
+
+    def preload_links(self, bottom=True):
+        """Values of the ``Link`` headers preloading the css and javascript URLs.
+
+        They can be sent as HTTP headers or as ``103 Early Hints``.
+
+        In:
+          - ``bottom`` -- preload the assets rendered at the bottom too
+
+        Return:
+          - list of the ``Link`` headers values
+        """
+        links = []
+
+        for kind, as_, registry in (('css', 'style', self._css_url), ('javascript', 'script', self._javascript_url)):
+            assets = registry.assets() if bottom else registry.top
+            links.extend(self._preload_link(url, as_, attributes) for url, attributes in self._bundle(kind, assets))
+
+        return links
+
+    def render_new(self, loaded=()):
+        """Render the assets not already loaded by the client, for a partial update.
+
+        The css and javascript URLs are not bundled, their URLs staying their ids.
+
+        In:
+          - ``loaded`` -- ids of the assets loaded by the client: the URLs of the css and
+            javascript URLs, the names of the named css and javascript
+
+        Return:
+          - list of the ``<link>``, ``<style>`` and ``<script>`` tags
+        """
+        loaded = frozenset(loaded)
+
+        def new(registry):
+            return [asset for asset in registry.assets() if asset.key not in loaded]
+
+        return (
+            self._render_css_urls(new(self._css_url), False)
+            + self._render_javascript_urls(new(self._javascript_url), False)
+            + self._render_named_css(new(self._named_css))
+            + self._render_named_javascript(new(self._named_javascript))
+        )
+
     def render_top(self):
         # Create the tags to include the CSS styles and the javascript codes
         head = self.root
@@ -272,52 +1254,41 @@ class HeadRenderer(xml.XmlRenderer):
         else:
             head = self.head(head)
 
-        head.extend(
-            self.link(rel='stylesheet', type='text/css', href=url, **attributes)
-            for url, (attributes, bottom) in self._css_url.items()
-            if not bottom
-        )
-        head.extend(
-            self.script(type='text/javascript', src=url, **attributes)
-            for url, (attributes, bottom) in self._javascript_url.items()
-            if not bottom
-        )
+        head.extend(self._render_css_urls(self._css_url.top))
+        head.extend(self._render_javascript_urls(self._javascript_url.top))
+        head.extend(self._render_named_css(self._named_css.top))
+        head.extend(self._render_named_javascript(self._named_javascript.top))
 
-        head.extend(
-            self.style(css, type='text/css', data_nagare_css=name, **attributes)
-            for name, (css, attributes, bottom) in self._named_css.items()
-            if not bottom
-        )
-        head.extend(
-            self.script(js, type='text/javascript', data_nagare_js=name, **attributes)
-            for name, (js, attributes, bottom) in self._named_javascript.items()
-            if not bottom
-        )
+        return head
+
+    def flush_top(self):
+        """Early rendering of the ``<head>``, before the body is built.
+
+        Only the assets registered so far are rendered. The assets registered
+        later, even the not ``bottom`` ones, will be rendered by ``render_bottom()``.
+
+        Return:
+          - the ``<head>`` tag
+        """
+        head = self.render_top()
+        self._flushed = tuple(len(registry.top) for registry in self._registries())
 
         return head
 
     def render_bottom(self):
+        # The top assets registered after ``flush_top()`` are rendered at the bottom too
+        if self._flushed is None:
+            assets = [registry.bottom for registry in self._registries()]
+        else:
+            assets = [registry.bottom_since(nb_top) for registry, nb_top in zip(self._registries(), self._flushed)]
+
+        css_url, javascript_url, named_css, named_javascript = assets
+
         return (
-            [
-                self.link(rel='stylesheet', type='text/css', href=url, **attributes)
-                for url, (attributes, bottom) in self._css_url.items()
-                if bottom
-            ]
-            + [
-                self.script(type='text/javascript', src=url, **attributes)
-                for url, (attributes, bottom) in self._javascript_url.items()
-                if bottom
-            ]
-            + [
-                self.style(css, type='text/css', data_nagare_css=name, **attributes)
-                for name, (css, attributes, bottom) in self._named_css.items()
-                if bottom
-            ]
-            + [
-                self.script(js, type='text/javascript', data_nagare_js=name, **attributes)
-                for name, (js, attributes, bottom) in self._named_javascript.items()
-                if bottom
-            ]
+            self._render_css_urls(css_url)
+            + self._render_javascript_urls(javascript_url)
+            + self._render_named_css(named_css)
+            + self._render_named_javascript(named_javascript)
         )
 
 
@@ -326,32 +1297,20 @@ class Renderer(xml.XmlRenderer):
     content_type = 'text/html'
     head_renderer_factory = HeadRenderer
 
-    componentattrs = {'id', 'class', 'style', 'title'}
-    i18nattrs = {'lang', 'dir'}
-    eventattrs = {
-        'onclick',
-        'ondblclick',
-        'onmousedown',
-        'onmouseup',
-        'onmousemove',
-        'onmouseover',
-        'onmouseout',
-        'onkeypress',
-        'onkeydown',
-        'onkeyup',
-    }
-    focusattrs = {'accesskey', 'tabindex', 'onfocus', 'onblur'}
-    cellhalignattrs = {'align', 'char', 'charoff'}
-    cellvalignattrs = {'valign'}
-    allattrs = componentattrs | i18nattrs | eventattrs
+    componentattrs = componentattrs
+    i18nattrs = i18nattrs
+    eventattrs = eventattrs
+    focusattrs = focusattrs
+    cellhalignattrs = cellhalignattrs
+    cellvalignattrs = cellvalignattrs
+    allattrs = allattrs
 
     # The HTML tags
     # -------------
 
     a = TagProp(
         'a',
-        allattrs
-        | focusattrs
+        allfocusattrs
         | {'charset', 'type', 'name', 'href', 'hreflang', 'rel', 'rev', 'shape', 'coords', 'target', 'oncontextmenu'},
     )
     abbr = TagProp('abbr', allattrs)
@@ -362,7 +1321,7 @@ class Renderer(xml.XmlRenderer):
         componentattrs
         | {'codebase', 'archive', 'code', 'object', 'alt', 'name', 'width', 'height', 'align', 'hspace', 'vspace'},
     )
-    area = TagProp('area', allattrs | focusattrs | {'shape', 'coords', 'href', 'nohref', 'alt', 'target'})
+    area = TagProp('area', allfocusattrs | {'shape', 'coords', 'href', 'nohref', 'alt', 'target'})
     b = TagProp('b', allattrs)
     basefont = TagProp('basefont', componentattrs | i18nattrs | {'id', 'size', 'color', 'face'})
     bdo = TagProp('bdo', componentattrs | eventattrs | {'lang', 'dir'})
@@ -388,18 +1347,18 @@ class Renderer(xml.XmlRenderer):
         },
     )
     br = TagProp('br', componentattrs | {'clear'})
-    button = TagProp('button', allattrs | focusattrs | {'name', 'value', 'type', 'disabled'})
-    caption = TagProp('caption', allattrs | {'align'})
+    button = TagProp('button', allfocusattrs | {'name', 'value', 'type', 'disabled'})
+    caption = TagProp('caption', alignattrs)
     center = TagProp('center', allattrs)
     cite = TagProp('cite', allattrs)
     code = TagProp('code', allattrs)
-    col = TagProp('col', allattrs | cellhalignattrs | cellvalignattrs | {'span', 'width'})
-    colgroup = TagProp('colgroup', allattrs | cellhalignattrs | cellvalignattrs | {'span', 'width'})
+    col = TagProp('col', cellattrs | {'span', 'width'})
+    colgroup = TagProp('colgroup', cellattrs | {'span', 'width'})
     dd = TagProp('dd', allattrs)
     del_ = TagProp('del', allattrs | {'cite', 'datetime'})
     dfn = TagProp('dfn', allattrs)
     dir = TagProp('dir', allattrs | {'compact'})
-    div = TagProp('div', allattrs | {'align'})
+    div = TagProp('div', alignattrs)
     dl = TagProp('dl', allattrs | {'compact'})
     dt = TagProp('dt', allattrs)
     em = TagProp('em', allattrs)
@@ -426,7 +1385,7 @@ class Renderer(xml.XmlRenderer):
     form = TagProp(
         'form', allattrs | {'action', 'method', 'name', 'enctype', 'onsubmit', 'onreset', 'accept_charset', 'target'}
     )
-    frame = TagProp('frame', set())
+    frame = TagProp('frame', frozenset())
     frameset = TagProp(
         'frameset',
         componentattrs
@@ -444,12 +1403,12 @@ class Renderer(xml.XmlRenderer):
             'scrolling',
         },
     )
-    h1 = TagProp('h1', allattrs | {'align'})
-    h2 = TagProp('h2', allattrs | {'align'})
-    h3 = TagProp('h3', allattrs | {'align'})
-    h4 = TagProp('h4', allattrs | {'align'})
-    h5 = TagProp('h5', allattrs | {'align'})
-    h6 = TagProp('h6', allattrs | {'align'})
+    h1 = TagProp('h1', alignattrs)
+    h2 = TagProp('h2', alignattrs)
+    h3 = TagProp('h3', alignattrs)
+    h4 = TagProp('h4', alignattrs)
+    h5 = TagProp('h5', alignattrs)
+    h6 = TagProp('h6', alignattrs)
     hr = TagProp('hr', allattrs | {'align', 'noshade', 'size', 'width', 'color'})
     html = TagProp('html', i18nattrs | {'id'})
     i = TagProp('i', allattrs)
@@ -471,6 +1430,7 @@ class Renderer(xml.XmlRenderer):
             'hspace',
             'vspace',
             'bordercolor',
+            'loading',
         },
     )
     img = TagProp(
@@ -490,13 +1450,17 @@ class Renderer(xml.XmlRenderer):
             'hspace',
             'vspace',
             'lowsrc',
+            'srcset',
+            'sizes',
+            'loading',
+            'decoding',
+            'fetchpriority',
         },
         Img,
     )
     input = TagProp(
         'input',
-        allattrs
-        | focusattrs
+        allfocusattrs
         | {
             'type',
             'name',
@@ -553,7 +1517,7 @@ class Renderer(xml.XmlRenderer):
     ol = TagProp('ol', allattrs | {'type', 'compact', 'start'})
     optgroup = TagProp('optgroup', allattrs | {'disabled', 'label'})
     option = TagProp('option', allattrs | {'selected', 'disabled', 'label', 'value'})
-    p = TagProp('p', allattrs | {'align'})
+    p = TagProp('p', alignattrs)
     param = TagProp('param', {'id', 'name', 'value', 'valuetype', 'type'})
     pre = TagProp('pre', allattrs | {'width'})
     q = TagProp('q', allattrs | {'cite'})
@@ -572,76 +1536,128 @@ class Renderer(xml.XmlRenderer):
     sub = TagProp('sub', allattrs)
     sup = TagProp('sup', allattrs)
     table = TagProp('table', componentattrs | i18nattrs | {'prompt'})
-    tbody = TagProp('tbody', allattrs | cellhalignattrs | cellvalignattrs)
-    td = TagProp(
-        'td',
-        allattrs
-        | cellhalignattrs
-        | cellvalignattrs
-        | {
-            'abbr',
-            'axis',
-            'headers',
-            'scope',
-            'rowspan',
-            'colspan',
-            'nowrap',
-            'bgcolor',
-            'width',
-            'height',
-            'background',
-            'bordercolor',
-        },
-    )
+    tbody = TagProp('tbody', cellattrs)
+    td = TagProp('td', tablecellattrs)
     textarea = TagProp(
         'textarea',
-        allattrs | focusattrs | {'name', 'rows', 'cols', 'disabled', 'readonly', 'onselect', 'onchange', 'wrap'},
-    )
-    tfoot = TagProp('tfoot', allattrs | cellhalignattrs | cellvalignattrs)
-    th = TagProp(
-        'th',
-        allattrs
-        | cellhalignattrs
-        | cellvalignattrs
-        | {
-            'abbr',
-            'axis',
-            'headers',
-            'scope',
-            'rowspan',
-            'colspan',
-            'nowrap',
-            'bgcolor',
-            'width',
-            'height',
-            'background',
-            'bordercolor',
-        },
+        allfocusattrs | {'name', 'rows', 'cols', 'disabled', 'readonly', 'onselect', 'onchange', 'wrap'},
     )
-    thead = TagProp('thead', allattrs | cellhalignattrs | cellvalignattrs)
-    tr = TagProp('tr', allattrs | cellhalignattrs | cellvalignattrs | {'bgcolor', 'nowrap', 'width', 'background'})
+    tfoot = TagProp('tfoot', cellattrs)
+    th = TagProp('th', tablecellattrs)
+    thead = TagProp('thead', cellattrs)
+    tr = TagProp('tr', cellattrs | {'bgcolor', 'nowrap', 'width', 'background'})
     tt = TagProp('tt', allattrs)
     u = TagProp('u', allattrs)
     ul = TagProp('ul', allattrs | {'type', 'compact'})
     var = TagProp('var', allattrs)
 
-    _parser = ET.HTMLParser()
-    _parser.set_element_class_lookup(ET.ElementDefaultClassLookup(element=Tag))
+    _parser = ThreadLocalParser(Tag)
+    templates_cache = templates_cache
+
+    # Serialization with the HTML5 syntax (minified short boolean attributes and implicit types)
+    html5_syntax = False
+
+    # Rendered subtrees, shared by all the renderers
+    fragments_cache = LRUCache(1024)
+    # Compressed static subtrees, by compressor settings and serialization
+    compressed_fragments_cache = LRUCache(256)
+
+    _head = None
+    _create_head = None  # Creation of the head renderer, in fragment mode
+    _head_kw = None  # Parameters of the head renderer, in fragment mode
 
-    def __init__(self, parent=None, *args, **kw):
+    def __init__(self, parent=None, *args, fragment=False, **kw):
         """Renderer initialisation.
 
         In:
           - ``parent`` -- parent renderer
+          - ``fragment`` -- fragment mode, for the partial updates: the head renderer
+            is only created when first used
+          - ``kw`` -- parameters of the head renderer initialisation
         """
         super().__init__(parent)
 
         if parent:
-            self.head = parent.head
+            # The parent can be any renderer with a head renderer
+            statics = getattr(parent, 'statics', None)
+            self.statics = set() if statics is None else statics
+
+            if getattr(parent, '_create_head', None) is None:
+                self.head = parent.head
+            else:
+                self._create_head = functools.partial(getattr, parent, 'head')
+                self._head_kw = parent._head_kw
+        else:
+            self.statics = set()
+            self._init_head(fragment, kw)
+
+    def _init_head(self, fragment, kw):
+        if fragment:
+            self._head = None
+            self._create_head = functools.partial(self.head_renderer_factory, **kw)
+            self._head_kw = kw
         else:
             self.head = self.head_renderer_factory(**kw)
 
+    @property
+    def head(self):
+        if self._create_head is not None:
+            self.head = self._create_head()
+
+        return self._head
+
+    @head.setter
+    def head(self, head):
+        self._head = head
+        self._create_head = self._head_kw = None
+
+    @property
+    def fragment(self):
+        """Is the head renderer still to create?"""
+        return self._create_head is not None
+
+    def reset(self, fragment=False, **kw):
+        """Forget the built tags and the registered assets, to reuse this root renderer.
+
+        In:
+          - ``fragment`` -- fragment mode
+          - ``kw`` -- parameters of the head renderer initialisation
+
+        Return:
+          - ``self``
+        """
+        super().__init__()
+
+        if fragment or (self._head is None):
+            self._init_head(fragment, kw)
+        else:
+            self._head.reset(**kw)
+
+        self.statics.clear()
+
+        return self
+
+    def fragment_assets(self, loaded=()):
+        """Render the assets registered by a partial update and not already loaded by the client.
+
+        In:
+          - ``loaded`` -- ids of the assets loaded by the client (see ``HeadRenderer.render_new()``)
+
+        Return:
+          - list of the ``<link>``, ``<style>`` and ``<script>`` tags
+        """
+        if self.fragment:
+            # The head renderer was never used: no assets were registered
+            return []
+
+        return self.head.render_new(loaded) if self.head is not None else []
+
     def fromfile(self, source, tags_factory=Tag, fragment=False, no_leading_text=False, **kw):
+        if isinstance(source, str) and (self.templates_cache is not None):
+            return self.templates_cache.get(
+                self, super().fromfile, source, tags_factory, fragment, no_leading_text, **kw
+            )
+
         return super().fromfile(source, tags_factory, fragment, no_leading_text, **kw)
 
     def fromstring(self, text, tags_factory=Tag, fragment=False, no_leading_text=False, **kw):
@@ -650,10 +1666,368 @@ class Renderer(xml.XmlRenderer):
     def absolute_url(self, url, url_prefix, always_relative=False, **params):
         return absolute_url(url, url_prefix, always_relative, **params)
 
+    @staticmethod
+    def _pull_parser(tags_factory, **kw):
+        parser = ET.HTMLPullParser(**kw)
+        parser.set_element_class_lookup(ET.ElementDefaultClassLookup(element=tags_factory))
+
+        return parser
+
+    def fromfile_incremental(self, source, tags_factory=Tag, chunk_size=CHUNK_SIZE, **kw):
+        """Parse a big HTML file without loading it into memory.
+
+        In:
+          - ``source`` -- path of the file, read through ``mmap``, or file-like object
+          - ``tags_factory`` -- class of the tags created
+          - ``chunk_size`` -- size of the chunks fed to the parser
+          - ``kw`` -- parameters of the ``lxml.etree.HTMLPullParser`` creation
+
+        Return:
+          - the root of the tree
+        """
+        parser = self._pull_parser(tags_factory, **kw)
+        for chunk in iter_chunks(source, chunk_size):
+            parser.feed(chunk)
+
+        return parser.close().init(self)
+
+    def iterparse(self, source, tags_factory=Tag, chunk_size=CHUNK_SIZE, **kw):
+        """Parse a big HTML file, yielding the children of its ``<body>`` one by one.
+
+        Each child is removed from the tree once parsed so the memory stays flat.
+        The texts between them are dropped.
+
+        In:
+          - ``source`` -- path of the file, read through ``mmap``, or file-like object
+          - ``tags_factory`` -- class of the tags created
+          - ``chunk_size`` -- size of the chunks fed to the parser
+          - ``kw`` -- parameters of the ``lxml.etree.HTMLPullParser`` creation
+
+        Return:
+          - generator of the top-level tags
+        """
+        parser = self._pull_parser(tags_factory, events=('end',), **kw)
+
+        for chunk in itertools.chain(iter_chunks(source, chunk_size), [None]):
+            if chunk is None:
+                parser.close()
+            else:
+                parser.feed(chunk)
+
+            for _, element in parser.read_events():
+                body = element.getparent()
+                if (body is not None) and (body.tag == 'body'):
+                    body.text = None
+                    body.remove(element)
+                    element.tail = None
+
+                    yield element.init(self)
+
+    def _head_settings(self):
+        """Settings of the head renderer the assets URLs are rewritten with."""
+        if self.fragment:
+            return tuple(self._head_kw.get(name) for name in ('static_url', 'assets_version', 'assets_manifest'))
+
+        head = self.head
+        return None if head is None else (head.static_url, head.assets_version, head.assets_manifest)
+
+    def _build_fragment(self, builder, settings):
+        renderer = self.__class__(self)
+
+        if settings is not None:
+            # Record the assets registered while building the subtree
+            static_url, assets_version, assets_manifest = settings
+            renderer.head = self.head_renderer_factory(
+                static_url=static_url, assets_version=assets_version, assets_manifest=assets_manifest
+            )
+
+        tree = builder(renderer)
+
+        return copy_tree(tree), (renderer.head.assets() if renderer.head is not None else ())
+
+    def cached(self, key, builder, ttl=None):
+        """Build a subtree once then reuse it.
+
+        The assets registered on the head renderer while building the subtree
+        are registered again each time the subtree is reused. A subtree is built
+        by settings of the head renderer, as its assets URLs are rewritten with them.
+
+        In:
+          - ``key`` -- key of the subtree into the fragments cache
+          - ``builder`` -- function called with a renderer to build the subtree
+          - ``ttl`` -- number of seconds the subtree is kept (``fragments_cache.ttl`` if ``None``)
+
+        Return:
+          - a copy of the subtree
+        """
+        settings = self._head_settings()
+        tree, assets = self.fragments_cache.get(
+            (self.__class__, key, settings), self._build_fragment, builder, settings, ttl=ttl
+        )
+        if any(assets) and (self.head is not None):
+            self.head.add_assets(assets)
+
+        return copy_tree(tree, self)
+
+    def static(self, key, builder, ttl=None):
+        """Build a subtree once then reuse it, marked as static.
+
+        When the page is compressed by ``compressed_stream()``, the compressed form
+        of the static subtrees are cached and reused.
+
+        In:
+          - ``key`` -- key of the subtree into the fragments cache
+          - ``builder`` -- function called with a renderer to build the subtree
+          - ``ttl`` -- number of seconds the subtree is kept (``fragments_cache.ttl`` if ``None``)
+
+        Return:
+          - a copy of the subtree
+        """
+        tree = self.cached(key, builder, ttl)
+        self.statics.update(tag for tag in (tree if isinstance(tree, list) else [tree]) if isinstance(tag, Tag))
+
+        return tree
+
+    def stream(self, root=None, encoding='utf-8', chunk_size=CHUNK_SIZE, **kw):
+        """Serialize a whole page, chunk by chunk.
+
+        In:
+          - ``root`` -- the tree to serialize (the root of this renderer by default)
+          - ``encoding`` -- encoding of the HTML
+          - ``chunk_size`` -- maximum size of the chunks
+          - ``kw`` -- other parameters of ``Tag.iter_serialize()``
+
+        Return:
+          - generator of the encoded doctype, then of the encoded chunks of the HTML
+        """
+        if self.doctype:
+            yield (self.doctype + '\n').encode(encoding)
+
+        roots = self.root if root is None else root
+        for tag in roots if isinstance(roots, (list, tuple)) else [roots]:
+            if isinstance(tag, Tag):
+                yield from tag.iter_serialize(encoding=encoding, chunk_size=chunk_size, **kw)
+            elif tag is not None:
+                yield _encode_text(tag, encoding)
+
+    def compressed_stream(self, root=None, compressor=None, encoding='utf-8', chunk_size=CHUNK_SIZE, **kw):
+        """Serialize and compress a whole page, chunk by chunk.
+
+        In:
+          - ``root`` -- the tree to serialize (the root of this renderer by default)
+          - ``compressor`` -- a ``Compressor`` (a ``GzipCompressor`` by default), its
+            ``content_encoding`` attribute being the value of the ``Content-Encoding`` header
+          - ``encoding`` -- encoding of the HTML
+          - ``chunk_size`` -- maximum size of the uncompressed chunks
+          - ``kw`` -- other parameters of ``Tag.iter_serialize()``
+
+        Return:
+          - generator of the compressed chunks
+        """
+        if compressor is None:
+            compressor = GzipCompressor()
+
+        if not kw.get('minify'):
+            kw.setdefault('statics', self.statics)
+
+        data = compressor.header()
+        if data:
+            yield data
+
+        for chunk in self.stream(root, encoding, chunk_size, **kw):
+            if isinstance(chunk, StaticChunk) and (compressor.fragment_key is not None):
+                fragment = self.compressed_fragments_cache.get(
+                    (compressor.fragment_key, chunk), compressor.compress_fragment, chunk
+                )
+                data = compressor.splice(chunk, fragment)
+            else:
+                data = compressor.compress(chunk)
+
+            if data:
+                yield data
+
+        yield compressor.flush()
+
+    def write_to(self, writable, root=None, encoding='utf-8', **kw):
+        """Serialize a whole page directly into a writer.
+
+        In:
+          - ``writable`` -- file-like object, ``bytearray`` or writable ``memoryview``
+          - ``root`` -- the tree to serialize (the root of this renderer by default)
+          - ``encoding`` -- encoding of the HTML
+          - ``kw`` -- other parameters of ``Tag.write_to()``
+
+        Return:
+          - number of bytes written
+        """
+        sink = Sink(writable)
+        doctype = self.doctype or None
+
+        roots = self.root if root is None else root
+        for tag in roots if isinstance(roots, (list, tuple)) else [roots]:
+            if isinstance(tag, Tag):
+                tag.write_to(sink, encoding, doctype=doctype, **kw)
+                doctype = None
+            elif tag is not None:
+                if doctype:
+                    sink.write((doctype + '\n').encode(encoding))
+                    doctype = None
+
+                sink.write(_encode_text(tag, encoding))
+
+        return sink.size
+
     def absolute_asset_url(self, url, static_prefix=None, always_relative=False, **params):
+        factory = self.head_renderer_factory
+        if self.fragment and (getattr(factory, 'absolute_asset_url', None) is HeadRenderer.absolute_asset_url):
+            # Don't create the head renderer
+            kw = self._head_kw
+            return _cached_absolute_asset_url(
+                factory.assets_url_cache,
+                url,
+                static_prefix if static_prefix is not None else kw.get('static_url'),
+                kw.get('assets_version'),
+                kw.get('assets_manifest'),
+                always_relative,
+                params,
+            )
+
         my_absolute_asset_url = self.head.absolute_asset_url if self.head is not None else absolute_url
         return my_absolute_asset_url(url, static_prefix, always_relative, **params)
 
+    def table_from_rows(self, rows, columns=None, formatters=None, **attributes):
+        """Build a table in one pass.
+
+        The cells are directly created as sub-elements, without going through
+        the tag factories.
+
+        In:
+          - ``rows`` -- iterable of rows, each row being an iterable of values
+          - ``columns`` -- optional headers of the columns
+          - ``formatters`` -- optional sequence of functions, one by column, converting
+            the values to text (``str`` if ``None``)
+          - ``attributes`` -- attributes of the ``<table>`` tag
+
+        Return:
+          - the ``<table>`` tag
+        """
+        sub_element = ET.SubElement
+        table = self.table(**attributes)
+
+        if columns is not None:
+            tr = sub_element(sub_element(table, 'thead'), 'tr')
+            for column in columns:
+                sub_element(tr, 'th').text = str(column)
+
+        tbody = sub_element(table, 'tbody')
+        formatters = [formatter or str for formatter in formatters or ()]
+
+        for row in rows:
+            tr = sub_element(tbody, 'tr')
+
+            for i, value in enumerate(row):
+                td = sub_element(tr, 'td')
+
+                if isinstance(value, ET._Element):
+                    td.append(value)
+                elif value is not None:
+                    td.text = formatters[i](value) if i < len(formatters) else str(value)
+
+        return table
+
+    def table_from_columns(self, data, columns=None, formatters=None, **attributes):
+        """Build a table in one pass, from columns of values.
+
+        In:
+          - ``data`` -- sequence of columns of the same length, each column being a sequence
+            or a NumPy-like array of values
+          - ``columns`` -- optional headers of the columns
+          - ``formatters`` -- optional sequence of functions, one by column, converting
+            the values to text (``str`` if ``None``)
+          - ``attributes`` -- attributes of the ``<table>`` tag
+
+        Return:
+          - the ``<table>`` tag
+        """
+        formatters = list(formatters or ())
+        formatters += [None] * (len(data) - len(formatters))
+
+        # Convert the arrays to lists of native values
+        data = [column.tolist() if hasattr(column, 'tolist') else column for column in data]
+        if len({len(column) for column in data}) > 1:
+            raise ValueError('columns of different lengths: %s' % ', '.join(str(len(column)) for column in data))
+
+        # Format a whole column at once, the empty cells and the tags excepted
+        data = [
+            column
+            if formatter is None
+            else [value if (value is None) or isinstance(value, ET._Element) else formatter(value) for value in column]
+            for column, formatter in zip(data, formatters)
+        ]
+
+        return self.table_from_rows(zip(*data), columns, **attributes)
+
     @staticmethod
     def decorate_error(tag, msg, classes=''):
         return tag
+
+
+class RenderersPool:
+    """Per thread pools of root renderers, reset and reused between requests."""
+
+    def __init__(self, renderer_factory, maxsize=4):
+        """Initialization.
+
+        In:
+          - ``renderer_factory`` -- class of the root renderers
+          - ``maxsize`` -- maximum number of idle renderers kept by thread
+        """
+        self.renderer_factory = renderer_factory
+        self.maxsize = maxsize
+
+        self._local = threading.local()
+
+    @property
+    def _idle(self):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = []
+
+        return idle
+
+    def acquire(self, **kw):
+        """Get a root renderer.
+
+        In:
+          - ``kw`` -- parameters of the head renderer initialisation
+
+        Return:
+          - a reset renderer
+        """
+        idle = self._idle
+        if not idle:
+            return self.renderer_factory(**kw)
+
+        renderer, reset_kw = idle.pop()
+        # The idle renderers are already reset by ``release()``, with these parameters
+        return renderer if reset_kw == kw else renderer.reset(**kw)
+
+    def release(self, renderer, **kw):
+        """Give back a root renderer, its tags and assets being released.
+
+        In:
+          - ``renderer`` -- the renderer returned by ``acquire()``
+          - ``kw`` -- parameters of the head renderer initialisation, for the next ``acquire()``
+        """
+        idle = self._idle
+        if len(idle) < self.maxsize:
+            idle.append((renderer.reset(**kw), kw))
+
+    @contextmanager
+    def renderer(self, **kw):
+        """Root renderer given back to the pool at the end of the ``with`` block."""
+        renderer = self.acquire(**kw)
+        try:
+            yield renderer
+        finally:
+            self.release(renderer, **kw)
@@ -0,0 +1,164 @@
+# --
+# Copyright (c) 2014-2026 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Compilation of the HTML templates into Python modules."""
+
+import os
+import re
+
+from lxml import etree as ET
+
+from nagare.renderers.html_base import Tag, Renderer, copy_tree
+
+# ---------------------------------------------------------------------------
+
+
+class CompiledTemplate:
+    """Template compiled into Python code by ``compile_template()``.
+
+    The tree is built once by tags class then copied each time the template is used.
+    """
+
+    def __init__(self, create):
+        """Initialization.
+
+        In:
+          - ``create`` -- function called with a ``makeelement`` function and returning the tree
+        """
+        self.create = create
+        self._trees = {}
+
+    def __call__(self, renderer, tags_factory=None):
+        """Copy of the template tree.
+
+        In:
+          - ``renderer`` -- the renderer the tags are bound to
+          - ``tags_factory`` -- class of the tags (``Tag`` by default)
+
+        Return:
+          - the root of the tree
+        """
+        tags_factory = tags_factory or Tag
+
+        tree = self._trees.get(tags_factory)
+        if tree is None:
+            parser = ET.HTMLParser()
+            parser.set_element_class_lookup(ET.ElementDefaultClassLookup(element=tags_factory))
+            tree = self._trees[tags_factory] = self.create(parser.makeelement)
+
+        return copy_tree(tree, renderer)
+
+
+def _compile_element(element, depth, lines):
+    indent = '    '
+    parent = 'e%d' % (depth - 1)
+    var = 'e%d' % depth
+
+    if element.tag is ET.Comment:
+        lines.append('%s%s = Comment(%r)' % (indent, var, element.text))
+        lines.append('%s%s.append(%s)' % (indent, parent, var))
+    elif element.tag is ET.ProcessingInstruction:
+        lines.append('%s%s = PI(%r, %r)' % (indent, var, element.target, element.text))
+        lines.append('%s%s.append(%s)' % (indent, parent, var))
+    else:
+        parent_nsmap = element.getparent().nsmap if element.getparent() is not None else {}
+        nsmap = {prefix: ns for prefix, ns in element.nsmap.items() if parent_nsmap.get(prefix) != ns}
+
+        if depth:
+            args = [parent, repr(element.tag)]
+            if element.attrib or nsmap:
+                args.append(repr(dict(element.attrib)))
+            if nsmap:
+                args.append(repr(nsmap))
+
+            lines.append('%s%s = SubElement(%s)' % (indent, var, ', '.join(args)))
+        else:
+            lines.append(
+                '%s%s = makeelement(%r, %r, %r)' % (indent, var, element.tag, dict(element.attrib), nsmap or None)
+            )
+
+        if element.text:
+            lines.append('%s%s.text = %r' % (indent, var, element.text))
+
+        for child in element:
+            _compile_element(child, depth + 1, lines)
+
+    if depth and element.tail:
+        lines.append('%s%s.tail = %r' % (indent, var, element.tail))
+
+
+def compile_template(root, source=None):
+    """Compile a tree into the code of a Python module rebuilding it.
+
+    The module defines a ``template`` object, a ``CompiledTemplate`` called with
+    a renderer to get a copy of the tree.
+
+    In:
+      - ``root`` -- root of the tree (i.e. the result of ``Renderer.fromfile()``)
+      - ``source`` -- optional name of the template, written into the module docstring
+
+    Return:
+      - the code of the module
+    """
+    lines = [
+        # The name of the template is escaped into a string literal
+        repr('Template %s compiled by ``nagare.renderers.templates.compile_template()``.' % (source or '')),
+        '',
+        'from lxml.etree import PI, Comment, SubElement',
+        '',
+        'from nagare.renderers.templates import CompiledTemplate',
+        '',
+        '',
+        'def create(makeelement):',
+    ]
+
+    _compile_element(root, 0, lines)
+    lines.extend(['    return e0', '', '', 'template = CompiledTemplate(create)', ''])
+
+    return '\n'.join(lines)
+
+
+def compile_file(filename, target=None, renderer=None):
+    """Compile a template file into a Python module.
+
+    In:
+      - ``filename`` -- path of the HTML template
+      - ``target`` -- path of the module (the template path with a ``.py`` extension by default)
+      - ``renderer`` -- renderer parsing the template (a ``Renderer`` by default)
+
+    Return:
+      - path of the module
+    """
+    renderer = renderer or Renderer()
+    target = target or os.path.splitext(filename)[0] + '.py'
+
+    code = compile_template(renderer.fromfile(filename), os.path.basename(filename))
+    with open(target, 'w', encoding='utf-8') as f:
+        f.write(code)
+
+    return target
+
+
+def load_template(filename):
+    """Import a compiled template module, its bytecode being cached by Python.
+
+    In:
+      - ``filename`` -- path of the module
+
+    Return:
+      - the ``CompiledTemplate`` of the module
+    """
+    import importlib.util  # Only imported when compiled templates are used
+
+    name = 'nagare_template_' + re.sub(r'\W', '_', os.path.abspath(filename))
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module.template
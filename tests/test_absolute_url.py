@@ -136,3 +136,57 @@ def test_absolute_asset_url6():
         'http://localhost/tmp?a=42&b=43',
         'http://localhost/tmp?b=43&a=42',
     )
+
+
+def test_assets_url_cache():
+    cache = html.LRUCache(2)
+
+    assert cache.get('a', str.upper, 'a') == 'A'
+    assert cache.get('b', str.upper, 'b') == 'B'
+    assert cache.get('a', str.upper, 'x') == 'A'
+    assert cache.get('c', str.upper, 'c') == 'C'
+    assert cache.get('b', str.upper, 'x') == 'X'
+    assert cache.info() == {'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2}
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2}
+
+    cache = html.LRUCache(0)
+    assert cache.get('a', str.upper, 'a') == 'A'
+    assert len(cache) == 0
+
+
+def test_absolute_asset_url_cached():
+    class HeadRenderer(html.HeadRenderer):
+        assets_url_cache = html.LRUCache()
+
+    head1 = HeadRenderer('/static/root', assets_version='1.2')
+    head2 = HeadRenderer('/static/root', assets_version='1.3')
+
+    assert head1.absolute_asset_url('abc') == '/static/root/abc?ver=1.2'
+    assert head1.absolute_asset_url('abc') == '/static/root/abc?ver=1.2'
+    assert head2.absolute_asset_url('abc') == '/static/root/abc?ver=1.3'
+    assert head1.absolute_asset_url('abc', foo='bar') == '/static/root/abc?ver=1.2&foo=bar'
+    assert head1.absolute_asset_url('abc', always_relative=True) == '/static/root/abc?ver=1.2'
+    assert head1.absolute_asset_url('/abc', always_relative=True) == '/static/root/abc'
+
+    assert HeadRenderer.assets_url_cache.info() == {'hits': 1, 'misses': 5, 'size': 5, 'maxsize': 1024}
+
+
+def test_assets_manifest(tmp_path):
+    filename = tmp_path / 'manifest.json'
+    filename.write_text('{"css/app.css": "css/app.3f2a1b.css", "/app.js": "/app.9c8d7e.js"}')
+    manifest = html.AssetsManifest.fromfile(str(filename))
+
+    head = html.HeadRenderer('/static', assets_version='1.2', assets_manifest=manifest)
+
+    assert head.absolute_asset_url('css/app.css') == '/static/css/app.3f2a1b.css'
+    assert head.absolute_asset_url('app.js') == '/static/app.9c8d7e.js'
+    assert head.absolute_asset_url('app.js?foo=bar') == '/static/app.9c8d7e.js?foo=bar'
+    assert head.absolute_asset_url('other.js') == '/static/other.js?ver=1.2'
+    assert head.absolute_asset_url('/app.js') == '/app.js'
+    assert head.absolute_asset_url('http://example.com/app.js') == 'http://example.com/app.js'
+
+    h = html.Renderer(static_url='/static', assets_version='1.2', assets_manifest=manifest)
+    assert h.script(src='app.js').tostring() == b'<script src="/static/app.9c8d7e.js"></script>'
+    assert h.script(src='other.js').tostring() == b'<script src="/static/other.js?ver=1.2"></script>'
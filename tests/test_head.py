@@ -7,6 +7,8 @@
 # this distribution.
 # --
 
+import base64
+import hashlib
 from io import BytesIO as BuffIO
 
 import pytest
@@ -295,3 +297,246 @@ def test_cache_buster():
     assert (
         h.link(rel='stylesheet', href='abc?foo=bar&hello=world').get('href') == '/root/abc?foo=bar&hello=world&ver=1.2'
     )
+
+
+def test_flush_top():
+    h = html.HeadRenderer('/static')
+    h << h.title('test')
+    h.css_url('a.css')
+    h.javascript_url('b.js', bottom=True)
+
+    assert c14n(h.flush_top()) == c14n(
+        '<head><title>test</title><link href="/static/a.css" type="text/css" rel="stylesheet"/></head>'
+    )
+
+    h.css_url('a.css')
+    h.css_url('c.css')
+    h.javascript('d', 'function d() {}')
+
+    assert [c14n(tag) for tag in h.render_bottom()] == [
+        c14n('<link href="/static/c.css" type="text/css" rel="stylesheet"/>'),
+        c14n('<script src="/static/b.js" type="text/javascript"></script>'),
+        c14n('<script data-nagare-js="d" type="text/javascript">function d() {}</script>'),
+    ]
+
+    h = html.HeadRenderer('/static')
+    h.css_url('a.css')
+    h.javascript_url('b.js', bottom=True)
+
+    assert [c14n(tag) for tag in h.render_bottom()] == [
+        c14n('<script src="/static/b.js" type="text/javascript"></script>')
+    ]
+
+
+def test_bundler(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'css' / 'a.css').write_bytes(b'a { background: url("img/a.png") }')
+    (static / 'css' / 'b.css').write_bytes(b'b { background: url(/b.png) }')
+    (static / 'c.css').write_bytes(b'c {}')
+    (static / 'a.js').write_bytes(b'a()')
+    (static / 'b.js').write_bytes(b'b()')
+
+    bundler = html.AssetsBundler('/static', str(static), str(tmp_path / 'bundles'))
+
+    h = html.HeadRenderer('/static', assets_version='1.2', bundler=bundler)
+    h.css_url('css/a.css')
+    h.css_url('css/b.css')
+    h.css_url('http://example.com/x.css')
+    h.css_url('c.css', media='print')
+    h.css_url('missing.css')
+    h.javascript_url('a.js')
+    h.javascript_url('b.js')
+    h.javascript_url('c.js', bottom=True)
+
+    head = h.render_top()
+    css = [link.get('href') for link in head.findall('link')]
+    js = [script.get('src') for script in head.findall('script')]
+
+    assert len(css) == 4
+    assert css[0].startswith('/static/bundles/') and css[0].endswith('.css')
+    assert css[1:] == ['http://example.com/x.css', '/static/c.css?ver=1.2', '/static/missing.css?ver=1.2']
+    assert len(js) == 1
+
+    with open(bundler.bundle_path(css[0].rsplit('/', 1)[1]), 'rb') as f:
+        assert f.read() == b'a { background: url("/static/css/img/a.png") }\nb { background: url(/b.png) }'
+
+    with open(bundler.bundle_path(js[0].rsplit('/', 1)[1]), 'rb') as f:
+        assert f.read() == b'a();\nb()'
+
+    assert [script.get('src') for script in h.render_bottom()] == ['/static/c.js?ver=1.2']
+
+    assert bundler.bundle_path('../static/a.js') is None
+    assert bundler.bundle_path('0123.css') is None
+
+    h = html.HeadRenderer('/static', assets_version='1.2', bundler=bundler)
+    h.css_url('css/a.css')
+    h.css_url('css/b.css')
+    assert h.render_top()[0].get('href') == css[0]
+    assert bundler._bundles.info()['hits'] == 1
+
+
+def test_bundler_assets_checks(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'a.css').write_bytes(b'a {}')
+    (static / 'b.css').write_bytes(b'@import url(x.css);\nb {}')
+    (static / 'c.css').write_bytes(b'c {}')
+    (static / 'd.css').write_bytes(b'@charset "utf-8";\nd {}')
+
+    bundler = html.AssetsBundler('/static', str(static), str(tmp_path / 'bundles'), stat_interval=60)
+
+    urls = [('/static/%s.css' % name, ()) for name in 'abcd']
+    assert bundler.bundle('css', urls) == urls
+
+    urls.insert(1, ('/static/c.css', ()))
+    bundled = bundler.bundle('css', urls)
+    assert bundled[0][0].startswith('/static/bundles/') and (bundled[1:] == urls[2:])
+
+    # The files are not checked again before ``stat_interval`` seconds
+    calls = []
+    monkeypatch.setattr(html.os, 'stat', lambda path: calls.append(path))
+    assert bundler.bundle('css', urls) == bundled
+    assert calls == []
+
+
+def test_assets_integrity(tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'a.css').write_bytes(b'a {}')
+    (static / 'a.js').write_bytes(b'a()')
+
+    integrity = html.AssetsIntegrity(
+        {'/static': str(static), 'https://cdn.example.com/assets/': str(static)},
+        hashes={'prebuilt.js': 'sha384-prebuilt'},
+    )
+    a_css = 'sha384-' + base64.b64encode(hashlib.sha384(b'a {}').digest()).decode('ascii')
+
+    assert integrity.get('/static/a.css?ver=1') == a_css
+    assert integrity.get('/static/prebuilt.js') == 'sha384-prebuilt'
+    assert integrity.get('/static/missing.css') is None
+    assert integrity.get('/static/../static.css') is None
+    assert integrity.get('http://example.com/a.css') is None
+    assert integrity.get('/static/a.css') == a_css
+    assert integrity._integrities.info()['hits'] == 1
+
+    h = html.HeadRenderer('/static', assets_version='1', assets_integrity=integrity)
+    h.css_url('a.css')
+    h.css_url('http://example.com/x.css')
+    h.javascript_url('https://cdn.example.com/assets/a.js')
+    h.javascript_url('prebuilt.js', integrity='sha384-mine')
+
+    head = h.render_top()
+    assert [link.get('integrity') for link in head.findall('link')] == [a_css, None]
+    scripts = head.findall('script')
+    assert scripts[0].get('integrity').startswith('sha384-') and scripts[0].get('crossorigin') == 'anonymous'
+    assert scripts[1].get('integrity') == 'sha384-mine'
+    assert h.preload_links()[0] == '</static/a.css?ver=1>; rel=preload; as=style; integrity="%s"' % a_css
+
+    (static / 'a.css').write_bytes(b'a, b {}')
+    assert integrity.get('/static/a.css') != a_css
+
+    with pytest.raises(ValueError):
+        html.AssetsIntegrity({}, algorithm='md5')
+
+
+def test_preload_links():
+    h = html.HeadRenderer('/static', assets_version='1.2')
+    h.css_url('a.css')
+    h.css_url('print.css', media='print')
+    h.javascript_url('http://example.com/b.js', crossorigin='anonymous', nonce='xyz')
+    h.javascript_url('c.js', bottom=True, crossorigin='')
+    h.javascript_url('d.js', type='module')
+    h.javascript('e', 'function e() {}')
+
+    assert h.preload_links() == [
+        '</static/a.css?ver=1.2>; rel=preload; as=style',
+        '</static/print.css?ver=1.2>; rel=preload; as=style; media="print"',
+        '<http://example.com/b.js>; rel=preload; as=script; crossorigin="anonymous"; nonce="xyz"',
+        '</static/c.js?ver=1.2>; rel=preload; as=script; crossorigin',
+        '</static/d.js?ver=1.2>; rel=modulepreload',
+    ]
+
+    assert h.preload_links(bottom=False) == [
+        '</static/a.css?ver=1.2>; rel=preload; as=style',
+        '</static/print.css?ver=1.2>; rel=preload; as=style; media="print"',
+        '<http://example.com/b.js>; rel=preload; as=script; crossorigin="anonymous"; nonce="xyz"',
+        '</static/d.js?ver=1.2>; rel=modulepreload',
+    ]
+
+
+def test_assets_registry():
+    registry = html.AssetsRegistry(True)
+
+    registry.add('a', 'code a', {}, False)
+    registry.add('b', 'code b', {'x': 1}, True)
+    registry.add('c', 'code c', {}, False)
+    registry.add('a', 'code a2', {}, True)
+    registry.add('d', 'code d', {}, True)
+
+    assert list(registry.items()) == [
+        ('a', ('code a', {}, False)),
+        ('b', ('code b', {'x': 1}, True)),
+        ('c', ('code c', {}, False)),
+        ('d', ('code d', {}, True)),
+    ]
+    assert [asset.key for asset in registry.top] == ['a', 'c']
+    assert [asset.key for asset in registry.bottom] == ['b', 'd']
+    assert [asset.key for asset in registry.bottom_since(2)] == ['b', 'd']
+    assert [asset.key for asset in registry.bottom_since(1)] == ['b', 'c', 'd']
+    assert [asset.key for asset in registry.bottom_since(0)] == ['a', 'b', 'c', 'd']
+
+    registry = html.AssetsRegistry(False)
+    registry.add('/a.css', None, {}, False)
+    assert registry['/a.css'] == ({}, False)
+
+
+def test_fragment_mode():
+    h = html.Renderer(fragment=True, static_url='/static', assets_version='3')
+    assert h.fragment
+
+    child = html.Renderer(h)
+    tree = child.div(child.img(src='a.png'))
+    assert tree.tostring() == b'<div><img src="/static/a.png?ver=3"></div>'
+    assert h.fragment and child.fragment
+    assert h.fragment_assets() == []
+
+    child.head.css_url('a.css')
+    child.head.css('b', 'b {}')
+    child.head.javascript_url('c.js')
+    child.head.javascript('d', 'd()')
+    assert not h.fragment
+    assert child.head is h.head
+    assert h.head.static_url == '/static'
+
+    assets = h.fragment_assets(['/static/a.css?ver=3', 'd'])
+    assert [c14n(tag) for tag in assets] == [
+        c14n('<script src="/static/c.js?ver=3" type="text/javascript"></script>'),
+        c14n('<style data-nagare-css="b" type="text/css">b {}</style>'),
+    ]
+
+    h.reset(fragment=True)
+    assert h.fragment
+    assert h.fragment_assets() == []
+
+    assert h.cached('fragment_item', lambda h: h.span).tostring() == b'<span></span>'
+    assert h.fragment
+
+    def menu(h):
+        h.head.css_url('menu.css')
+        return h.ul
+
+    assert h.cached('fragment_menu', menu).tostring() == b'<ul></ul>'
+    assert [tag.get('href') for tag in h.fragment_assets()] == ['/menu.css']
+
+
+def test_fragment_mode_head_renderer_override():
+    class HeadRenderer(html.HeadRenderer):
+        def absolute_asset_url(self, url, *args, **params):
+            return 'https://cdn.example.com/' + url
+
+    class Renderer(html.Renderer):
+        head_renderer_factory = HeadRenderer
+
+    h = Renderer(fragment=True, static_url='/static')
+    assert h.img(src='a.png').tostring() == b'<img src="https://cdn.example.com/a.png">'
@@ -7,8 +7,13 @@
 # this distribution.
 # --
 
+import io
+import zlib
+import gzip
+
 import pytest
 
+from nagare.renderers import xml
 from nagare.renderers import html_base as html
 
 
@@ -56,6 +61,11 @@ def test_url():
     assert h.img(src='/abc', lowsrc='/def').tostring() == b'<img src="/abc" lowsrc="/def">'
     assert h.img(src='abc', lowsrc='def').tostring() == b'<img src="/root/abc" lowsrc="/root/def">'
 
+    h = html.Renderer(static_url='/root', assets_version='1')
+
+    img = h.img(src='a.jpg', srcset='a-1.jpg 1x,/b.jpg 2x, http://x.com/c.jpg', sizes='50vw')
+    assert img.get('srcset') == '/root/a-1.jpg?ver=1 1x, /b.jpg 2x, http://x.com/c.jpg'
+
     h = html.Renderer()
 
     assert h.input(src='/abc').tostring() == b'<input src="/abc">'
@@ -157,3 +167,374 @@ def test_htmltag_write_xmlstring3():
         h.root.tostring(pipeline=False)
         == b'<table><tr><td xmlns:ns0="http://www.plope.com/software/meld3"></td><tr><td xmlns:ns0="http://www.plope.com/software/meld3"></td></tr></tr></table>'
     )
+
+
+def test_iter_serialize():
+    h = html.Renderer()
+
+    with h.html:
+        h << h.head.head(h.head.title('test'))
+        with h.body:
+            h << 'hello'
+            with h.table(class_='foo'):
+                for i in range(1000):
+                    h << h.tr(h.td(i), h.td('a < b'), h.td().meld_id('test')) << '\n'
+            h << h.p('world') << 'end'
+
+    root = h.root
+    html_ = root.tostring()
+
+    chunks = list(root.iter_serialize(chunk_size=1000))
+    assert b''.join(chunks) == html_
+    assert len(chunks) > 1
+    assert all(len(chunk) == 1000 for chunk in chunks[:-1])
+
+    assert b''.join(root.iter_serialize(depth=0)) == html_
+    assert b''.join(root.iter_serialize(method='xml', pipeline=False)) == root.tostring(method='xml', pipeline=False)
+
+    assert h.p.iter_serialize().__next__() == b'<p></p>'
+
+
+def test_iter_serialize_big_subtree():
+    h = html.Renderer()
+
+    table = h.table(h.tbody([h.tr(h.td(i), h.td('a < b')) for i in range(2000)]))
+    root = h.html(h.body(h.div(h.div(table))))
+    html_ = root.tostring()
+
+    # The big table is opened, even below ``depth``
+    pieces = list(root._iter_serialize('html', 'utf-8', True, 3, 100))
+    assert b''.join(pieces) == html_
+    assert max(len(piece) for piece in pieces) < 100 * 20
+
+    assert b''.join(root.iter_serialize(max_elements=100)) == html_
+    assert len(list(root._iter_serialize('html', 'utf-8', True, 0, 10000))) == 1
+
+
+def test_iter_serialize_namespaces():
+    h = html.Renderer()
+
+    root = h.div(h.div(h.div(h.div(h.p('x').meld_id('b')).meld_id('c'))))
+    root.meld_id('a')
+    root[0][0].meld_id('d')
+
+    for method in ('html', 'xml'):
+        for depth in range(6):
+            assert b''.join(root.iter_serialize(method, depth=depth)) == root.tostring(method)
+
+    root = h.fromstring(
+        '<div xmlns:meld="http://www.plope.com/software/meld3" meld:id="a">'
+        '<section><ul meld:id="m"><li meld:id="i">x</li></ul></section></div>'
+    )
+    assert b''.join(root.iter_serialize(depth=3)) == root.tostring()
+
+
+def test_stream():
+    h = html.Renderer()
+
+    h << h.html(h.body(h.p('hello')))
+
+    assert list(h.stream()) == [h.doctype.encode('utf-8') + b'\n', b'<html><body><p>hello</p></body></html>']
+    assert b''.join(h.stream(h.p('world'))) == h.doctype.encode('utf-8') + b'\n<p>world</p>'
+
+
+def test_write_to():
+    h = html.Renderer()
+    h << h.html(h.body(h.p('héllo', h.input(type='checkbox', checked='checked'))))
+    page = b''.join(h.stream())
+
+    f = io.BytesIO()
+    assert h.write_to(f) == len(page)
+    assert f.getvalue() == page
+
+    buffer = bytearray(b'HTTP/1.1 200 OK\r\n\r\n')
+    assert h.write_to(buffer) == len(page)
+    assert buffer.endswith(page)
+
+    buffer = bytearray(1024)
+    size = h.write_to(memoryview(buffer))
+    assert buffer[:size] == page
+
+    with pytest.raises(ValueError):
+        h.write_to(memoryview(bytearray(10)))
+
+    root = h.div(h.p('a'), 'b')
+    buffer = bytearray()
+    assert root.write_to(buffer, method='xml') == len(buffer)
+    assert buffer == root.tostring(method='xml')
+
+    buffer = bytearray()
+    h.write_to(buffer, h.p('a'), encoding='iso-8859-1', pipeline=False)
+    assert buffer == b''.join(h.stream(h.p('a'), encoding='iso-8859-1'))
+
+
+def test_renderers_pool():
+    pool = html.RenderersPool(html.Renderer, maxsize=1)
+
+    with pool.renderer(static_url='/static') as h1:
+        h1.head.css_url('a.css')
+        h1.head.javascript('a', 'a()')
+        h1 << h1.p(h1.img(src='a.png'))
+        assert b''.join(h1.stream()).endswith(b'<p><img src="/static/a.png"></p>')
+
+    with pool.renderer(static_url='/other') as h2:
+        assert h2 is h1
+        assert list(h2.head._css_url) == []
+        assert list(h2.head._named_javascript) == []
+        assert h2.head._css_url.top == []
+        assert b''.join(h2.stream()) == h2.doctype.encode('utf-8') + b'\n'
+
+        h2 << h2.p(h2.img(src='b.png'))
+        assert b''.join(h2.stream()).endswith(b'<p><img src="/other/b.png"></p>')
+
+        with pool.renderer() as h3:
+            assert h3 is not h2
+
+    # Only one idle renderer is kept
+    assert pool.acquire() is h3
+    assert pool.acquire() not in (h2, h3)
+
+
+def test_srcset():
+    assert html.parse_srcset('') == []
+    assert html.parse_srcset(' a.jpg ') == [('a.jpg', '')]
+    assert html.parse_srcset('a.jpg 100w, b,c.jpg 2x,d.jpg,, e.jpg') == [
+        ('a.jpg', '100w'),
+        ('b,c.jpg', '2x'),
+        ('d.jpg', ''),
+        ('e.jpg', ''),
+    ]
+    assert html.parse_srcset('data:image/png;base64,AAA= 1x, a.jpg (a, b) 2x') == [
+        ('data:image/png;base64,AAA=', '1x'),
+        ('a.jpg', '(a, b) 2x'),
+    ]
+
+    assert html.rewrite_srcset('a.jpg 1x,b.jpg', str.upper) == 'A.JPG 1x, B.JPG'
+
+    assert html.build_srcset('hero-{size}.jpg', (320, 640)) == 'hero-320.jpg 320w, hero-640.jpg 640w'
+    assert html.build_srcset('hero.jpg?d={size}', (1, 2), 'x') == 'hero.jpg?d=1 1x, hero.jpg?d=2 2x'
+
+    h = html.Renderer(static_url='/static')
+    img = h.img(src='hero.jpg', srcset=html.build_srcset('hero-{size}.jpg', (320, 640)))
+    assert img.tostring() == (
+        b'<img src="/static/hero.jpg" srcset="/static/hero-320.jpg 320w, /static/hero-640.jpg 640w">'
+    )
+
+
+def test_compressed_stream():
+    class Renderer(html.Renderer):
+        compressed_fragments_cache = html.LRUCache(2)
+
+    def menu(h):
+        return h.ul([h.li('item %d' % i) for i in range(100)])
+
+    def render():
+        h = Renderer()
+        h << h.html(h.body(h.div(h.div(h.static('menu', menu)), h.p('hello'))))
+        return h
+
+    h = render()
+    page = b''.join(h.stream())
+    assert b''.join(h.stream(statics=h.statics)) == page
+    static_chunks = [chunk for chunk in h.stream(statics=h.statics, depth=0) if isinstance(chunk, html.StaticChunk)]
+    assert static_chunks == [next(iter(h.statics)).tostring()]
+
+    assert gzip.decompress(b''.join(h.compressed_stream())) == page
+    assert Renderer.compressed_fragments_cache.info()['misses'] == 1
+
+    h = render()
+    assert gzip.decompress(b''.join(h.compressed_stream(compressor=html.GzipCompressor(9)))) == page
+    assert zlib.decompress(b''.join(h.compressed_stream(compressor=html.ZlibCompressor()))) == page
+    assert Renderer.compressed_fragments_cache.info() == {'hits': 1, 'misses': 2, 'size': 2, 'maxsize': 2}
+
+    class Compressor(html.Compressor):
+        def __init__(self):
+            self.compressor = zlib.compressobj()
+
+        def compress(self, data):
+            return self.compressor.compress(data)
+
+        def flush(self):
+            return self.compressor.flush()
+
+    assert zlib.decompress(b''.join(render().compressed_stream(compressor=Compressor()))) == page
+    assert Renderer.compressed_fragments_cache.info()['size'] == 2
+
+    with pytest.raises(TypeError):
+        html.Compressor()
+
+
+def test_other_parent_renderer():
+    class Other(xml.XmlRenderer):
+        def __init__(self):
+            super().__init__()
+            self.head = html.HeadRenderer(static_url='/static')
+
+    parent = Other()
+    h = html.Renderer(parent)
+    assert h.head is parent.head
+    assert h.statics == set()
+    assert h.img(src='a.png').tostring() == b'<img src="/static/a.png">'
+
+    child = html.Renderer(h)
+    assert child.head is parent.head
+    assert child.statics is h.statics
+
+
+def test_cached():
+    calls = []
+
+    def menu(h):
+        calls.append(h)
+
+        h.head.css_url('menu.css')
+        h.head.javascript('menu', 'function menu() {}')
+
+        return h.ul(h.li('a'), h.li(h.img(src='logo.png')))
+
+    class Renderer(html.Renderer):
+        fragments_cache = html.LRUCache(2)
+
+    h1 = Renderer(static_url='/static')
+    root1 = h1.cached('menu', menu)
+    assert root1.tostring() == b'<ul><li>a</li><li><img src="/static/logo.png"></li></ul>'
+    assert root1.renderer is h1
+    assert list(h1.head._css_url) == ['/static/menu.css']
+    assert list(h1.head._named_javascript) == ['menu']
+
+    h2 = Renderer(static_url='/static')
+    root2 = h2.cached('menu', menu)
+    assert root2.tostring() == b'<ul><li>a</li><li><img src="/static/logo.png"></li></ul>'
+    assert root2.renderer is h2
+    assert list(h2.head._css_url) == ['/static/menu.css']
+    assert list(h2.head._named_javascript) == ['menu']
+
+    assert len(calls) == 1
+    assert Renderer.fragments_cache.info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+    h2.cached('menu2', menu, ttl=0)
+    h2.cached('menu2', menu, ttl=0)
+    assert len(calls) == 3
+
+
+def test_cached_by_settings():
+    def menu(h):
+        return h.ul(h.li(h.img(src='logo.png')))
+
+    h1 = html.Renderer(static_url='/static', assets_version='1')
+    h2 = html.Renderer(static_url='/cdn', assets_version='2')
+    h3 = html.Renderer(static_url='/cdn', assets_version='2', fragment=True)
+
+    assert h1.cached('settings_menu', menu).tostring() == b'<ul><li><img src="/static/logo.png?ver=1"></li></ul>'
+    assert h2.cached('settings_menu', menu).tostring() == b'<ul><li><img src="/cdn/logo.png?ver=2"></li></ul>'
+    assert h3.cached('settings_menu', menu).tostring() == b'<ul><li><img src="/cdn/logo.png?ver=2"></li></ul>'
+    assert h3.static('settings_menu', menu).tostring() == b'<ul><li><img src="/cdn/logo.png?ver=2"></li></ul>'
+
+
+def test_lru_cache_ttl():
+    cache = html.LRUCache(ttl=0)
+
+    assert cache.get('a', str.upper, 'a') == 'A'
+    assert cache.get('a', str.upper, 'x') == 'X'
+    assert cache.get('a', str.upper, 'y', ttl=3600) == 'Y'
+    assert cache.get('a', str.upper, 'z') == 'Y'
+    assert cache.info() == {'hits': 1, 'misses': 3, 'size': 1, 'maxsize': 1024}
+
+
+def test_classes():
+    h = html.Renderer()
+
+    tag = h.div(class_='a b')
+    classes = tag.classes
+    classes.add('c')
+    classes.discard('a')
+    tag.classes = classes
+    assert tag.get('class') == 'b c'
+
+    assert isinstance(html.Renderer.allattrs, frozenset)
+    assert html.tablecellattrs >= html.cellattrs >= html.allattrs
+
+
+def test_class_methods():
+    h = html.Renderer()
+
+    tag = h.div
+    assert tag.add_class('a', 'b', 'a') is tag
+    assert tag.get('class') == 'a b'
+    assert tag.has_class('a') and not tag.has_class('c')
+
+    tag.add_class('b', 'c').remove_class('a')
+    assert tag.get('class') == 'b c'
+
+    tag.toggle_class('b').toggle_class('d')
+    assert tag.get('class') == 'c d'
+
+    tag.toggle_class('c', True).toggle_class('e', False)
+    assert tag.get('class') == 'c d'
+
+    tag.remove_class('c', 'd')
+    assert tag.get('class') is None
+
+    tags = [h.td(class_='odd'), h.td(class_='even'), h.td(class_='odd'), h.td]
+    html.update_classes(tags, add=('cell', 'odd'), remove=('even',))
+    assert [tag.get('class') for tag in tags] == ['odd cell', 'cell odd', 'odd cell', 'cell odd']
+
+    html.update_classes(tags, remove=('cell', 'odd'))
+    assert [tag.get('class') for tag in tags] == [None, None, None, None]
+
+
+def test_table_from_rows():
+    h = html.Renderer()
+
+    rows = [(1, 'a', 1.5), (2, None, h.b('x')), (3, 'c<')]
+    table = h.table_from_rows(rows, ('id', 'name', 'price'), (None, str.upper), class_='grid')
+
+    assert table.tostring() == (
+        b'<table class="grid">'
+        b'<thead><tr><th>id</th><th>name</th><th>price</th></tr></thead>'
+        b'<tbody>'
+        b'<tr><td>1</td><td>A</td><td>1.5</td></tr>'
+        b'<tr><td>2</td><td></td><td><b>x</b></td></tr>'
+        b'<tr><td>3</td><td>C&lt;</td></tr>'
+        b'</tbody>'
+        b'</table>'
+    )
+    assert all(isinstance(tag, html.Tag) for tag in table.iter())
+    assert table[1][0][0].renderer is h
+
+    table = h.table_from_columns([(1, None, h.b('x')), ('a', None, 'c')], formatters=(lambda v: '#%d' % v,))
+    assert table.tostring() == (
+        b'<table><tbody>'
+        b'<tr><td>#1</td><td>a</td></tr>'
+        b'<tr><td></td><td></td></tr>'
+        b'<tr><td><b>x</b></td><td>c</td></tr>'
+        b'</tbody></table>'
+    )
+
+    with pytest.raises(ValueError):
+        h.table_from_columns([(1, 2), ('a',)])
+
+
+def test_minify():
+    h = html.Renderer()
+
+    root = h.div(
+        '\n  Hello \t  world  ',
+        h.pre('  keep\n   this  '),
+        h.ul('\n  ', h.li(' a '), '\n  ', h.li('b'), '\n'),
+        h.script('', type='text/javascript', async_='async'),
+    )
+
+    # Only the whitespaces are minified out of the HTML5 syntax
+    assert root.tostring(minify=True) == (
+        b'<div> Hello world <pre>  keep\n   this  </pre>'
+        b'<ul><li> a </li><li>b</li></ul>'
+        b'<script type="text/javascript" async="async"></script></div>'
+    )
+    assert root.tostring(method='xml', minify=True).endswith(
+        b'<script type="text/javascript" async="async"></script></div>'
+    )
+    assert b''.join(root.iter_serialize(minify=True, depth=1)) == root.tostring(minify=True)
+
+    # The original tree is unchanged
+    assert b'\n  Hello' in root.tostring()
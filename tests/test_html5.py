@@ -7,6 +7,8 @@
 # this distribution.
 # --
 
+import io
+
 import pytest
 
 from nagare.renderers import html_base as html
@@ -25,6 +27,106 @@ def test_new_tags():
     assert root.tostring() == b'<section></section>'
 
 
+def test_picture():
+    h = html5.Renderer(static_url='/static', assets_version='2')
+
+    picture = h.picture(
+        h.source(type='image/webp', srcset='hero-320.webp 320w, hero-640.webp 640w', sizes='50vw'),
+        h.img(src='hero.jpg'),
+    )
+    assert picture.tostring() == (
+        b'<picture><source type="image/webp" '
+        b'srcset="/static/hero-320.webp?ver=2 320w, /static/hero-640.webp?ver=2 640w" sizes="50vw"></source>'
+        b'<img src="/static/hero.jpg?ver=2"></picture>'
+    )
+
+    assert h.video(h.source(src='movie.mp4')).tostring() == (b'<video><source src="movie.mp4"></source></video>')
+
+
+def test_loading_policy():
+    def render(renderer):
+        h = renderer()
+        h << h.html(
+            h.body(
+                h.img(src='logo.png', fetchpriority='low'),
+                h.img(src='hero.png'),
+                h.iframe(src='video.html'),
+                h.img(src='a.png'),
+                h.img(src='b.png', loading='eager'),
+            )
+        )
+        return h
+
+    h = render(html5.Renderer)
+    assert b''.join(h.stream()).count(b'loading') == 1
+
+    class Renderer(html5.Renderer):
+        eager_loading = 2
+
+    h = render(Renderer)
+    page = b''.join(h.stream())
+    assert page.endswith(
+        b'<body><img src="/logo.png" fetchpriority="low"><img src="/hero.png" fetchpriority="high">'
+        b'<iframe src="video.html" loading="lazy"></iframe>'
+        b'<img src="/a.png" loading="lazy" decoding="async">'
+        b'<img src="/b.png" loading="eager" decoding="async"></body></html>'
+    )
+
+    h = render(Renderer)
+    h.apply_loading_policy()
+    h.apply_loading_policy()
+    assert b''.join(h.stream()) == page
+
+    buffer = io.BytesIO()
+    render(Renderer).write_to(buffer)
+    assert buffer.getvalue() == page
+
+    # Without a manual call
+    h = render(Renderer)
+    assert page.endswith(h.root.tostring())
+    assert page.endswith(b''.join(h.root.iter_serialize()))
+
+    # Only on the root tree of the renderer
+    h = Renderer()
+    assert h.img(src='a.png').tostring() == b'<img src="/a.png">'
+
+
+def test_minify():
+    h = html5.Renderer()
+
+    root = h.div(
+        '\n  Hello \t  world  ',
+        h.input(type='checkbox', checked='checked'),
+        h.script('var s = \'<input checked="">\';', type='text/javascript'),
+        h.style('a[hidden=""] {}', type='text/css'),
+        h.script('', type='module', async_='async'),
+    )
+
+    assert root.tostring(minify=True) == (
+        b'<div> Hello world <input type="checkbox" checked>'
+        b'<script>var s = \'<input checked="">\';</script>'
+        b'<style>a[hidden=""] {}</style>'
+        b'<script type="module" async></script></div>'
+    )
+    assert b''.join(root.iter_serialize(minify=True, depth=1)) == root.tostring(minify=True)
+
+    # Not with the XML syntax
+    xml = root.tostring(method='xml', minify=True)
+    assert b'<input type="checkbox" checked="checked"/>' in xml
+    assert b'<script type="text/javascript">' in xml
+    assert b'<script type="module" async="async"></script>' in xml
+
+    # The original tree is unchanged
+    assert b'async="async"' in root.tostring()
+
+    # The attributes values are kept as is
+    tag = h.input(type='text', value='a checked="" b', title='x > y hidden="" z', required='required')
+    assert tag.tostring(minify=True) == (
+        b'<input type="text" value=\'a checked="" b\' title=\'x &gt; y hidden="" z\' required>'
+    )
+    assert b''.join(h.div(tag).iter_serialize(minify=True, depth=1)) == h.div(tag).tostring(minify=True)
+
+
 def test_obsolete_tags():
     h = html.Renderer()
 
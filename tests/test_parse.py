@@ -8,12 +8,13 @@
 # --
 
 import os
+import threading
 from io import StringIO
 
 import pytest
 from lxml.etree import XMLSyntaxError
 
-from nagare.renderers import xml
+from nagare.renderers import xml, templates
 from nagare.renderers import html_base as html
 
 
@@ -121,3 +122,141 @@ def test_parse10():
     assert len(root) == 2
     assert root[0].tostring() == b'<a>text</a>'
     assert root[1].tostring() == b'<b>text</b>'
+
+
+def test_templates_cache(tmp_path):
+    filename = str(tmp_path / 'template.html')
+    with open(filename, 'w') as f:
+        f.write('<html><body><p>hello</p></body></html>')
+
+    templates_cache = html.TemplatesCache()
+
+    class Renderer(html.Renderer):
+        pass
+
+    Renderer.templates_cache = templates_cache
+
+    h1 = Renderer()
+    root1 = h1.fromfile(filename)
+    assert root1.tostring() == b'<html><body><p>hello</p></body></html>'
+    assert root1.renderer is h1
+
+    h2 = Renderer()
+    root2 = h2.fromfile(filename)
+    assert root2.tostring() == b'<html><body><p>hello</p></body></html>'
+    assert root2.renderer is h2
+    assert root2 is not root1
+    assert len(templates_cache._templates) == 1
+
+    root2[0][0].text = 'world'
+    assert Renderer().fromfile(filename).tostring() == b'<html><body><p>hello</p></body></html>'
+
+    h1.fromfile(filename, encoding='utf-8')
+    assert len(templates_cache._templates) == 2
+
+    with open(filename, 'w') as f:
+        f.write('<html><body><p>world</p></body></html>')
+    mtime = os.stat(filename).st_mtime_ns + 1000000000
+    os.utime(filename, ns=(mtime, mtime))
+
+    assert h1.fromfile(filename).tostring() == b'<html><body><p>world</p></body></html>'
+
+    templates_cache.stat_interval = 3600
+    with open(filename, 'w') as f:
+        f.write('<html><body><p>foo</p></body></html>')
+    os.utime(filename, ns=(mtime + 1000000000, mtime + 1000000000))
+
+    assert h1.fromfile(filename).tostring() == b'<html><body><p>world</p></body></html>'
+
+
+def test_thread_local_parser():
+    h = html.Renderer()
+    results = {}
+    errors = []
+
+    def parse(i):
+        try:
+            parser = h._parser
+            root = h.fromstring('<html><body><p>%d</p></body></html>' % i)
+            results[i] = (parser, h._parser, root, root.tostring())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=parse, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(results) == [0, 1, 2, 3]
+
+    for i, (parser, same_parser, root, serialization) in results.items():
+        assert parser is same_parser
+        assert isinstance(root, html.Tag)
+        assert serialization == b'<html><body><p>%d</p></body></html>' % i
+
+    assert len({id(parser) for parser, _, _, _ in results.values()}) == 4
+    assert html.Renderer._parser is html.Renderer()._parser
+
+
+def test_incremental_parsing(tmp_path):
+    filename = str(tmp_path / 'export.html')
+    with open(filename, 'w') as f:
+        f.write('<html><head><title>Export</title></head><body>\n')
+        for i in range(1000):
+            f.write('<div class="row"><img src="img/%d.png"> row %d</div>\n' % (i, i))
+        f.write('</body></html>')
+
+    h = html.Renderer(static_url='/static')
+
+    root = h.fromfile_incremental(filename, chunk_size=100)
+    assert root.renderer is h
+    assert root.tostring() == h.fromfile(filename).tostring()
+
+    with open(filename, 'rb') as f:
+        assert h.fromfile_incremental(f).tostring() == root.tostring()
+
+    with open(filename, 'rb') as f:
+        assert not isinstance(h.fromfile_incremental(f, xml.Tag), html.Tag)
+
+    rows = list(h.iterparse(filename, chunk_size=1000))
+    assert len(rows) == 1000
+    assert all(isinstance(row, html.Tag) and (row.getparent() is None) for row in rows)
+    assert rows[-1].tostring() == b'<div class="row"><img src="img/999.png"> row 999</div>'
+    assert rows[0].renderer is h
+
+    empty = tmp_path / 'empty.html'
+    empty.write_bytes(b'')
+    with pytest.raises(XMLSyntaxError):
+        list(h.iterparse(str(empty)))
+
+
+def test_compile_template(tmp_path):
+    filename = tmp_path / 'page.html'
+    filename.write_text(
+        '<html xmlns:meld="http://www.plope.com/software/meld3"><head><title>Page</title></head>'
+        '<body class="page">\n<!-- menu --><ul meld:id="menu"><li>a &amp; b</li>\n<li>c</li></ul>tail</body></html>'
+    )
+
+    h = html.Renderer()
+    module = templates.compile_file(str(filename))
+    assert module == str(tmp_path / 'page.py')
+
+    template = templates.load_template(module)
+    root = template(h)
+    assert isinstance(root, html.Tag)
+    assert root.renderer is h
+    assert root.tostring() == h.fromfile(str(filename)).tostring()
+
+    root2 = template(h)
+    assert root2 is not root
+    assert root2.tostring() == root.tostring()
+
+    assert not isinstance(template(h, xml.Tag), html.Tag)
+
+    source = 'C:\\templates\\"""page""".html'
+    code = templates.compile_template(h.fromfile(str(filename)), source)
+    namespace = {}
+    exec(compile(code, 'page.py', 'exec'), namespace)
+    assert source in namespace['__doc__']